@@ -12,6 +12,60 @@ ANNOTATORJS_FORMAT = 'ANNOTATORJS_FORMAT'
 # max number of rows to be returned in a search request
 CATCH_RESPONSE_LIMIT = getattr(settings, 'CATCH_RESPONSE_LIMIT')
 
+# rows fetched per round trip when streaming search responses
+CATCH_SEARCH_STREAM_CHUNK_SIZE = getattr(
+    settings, 'CATCH_SEARCH_STREAM_CHUNK_SIZE', 100)
+
+# how search computes `total`
+COUNT_MODE_EXACT = 'exact'
+COUNT_MODE_CACHED = 'cached'
+COUNT_MODE_ESTIMATED = 'estimated'
+COUNT_MODE_NONE = 'none'
+COUNT_MODE_WINDOW = 'window'
+COUNT_MODES = [
+    COUNT_MODE_EXACT, COUNT_MODE_CACHED, COUNT_MODE_ESTIMATED, COUNT_MODE_NONE,
+    COUNT_MODE_WINDOW]
+CATCH_SEARCH_COUNT_MODE = getattr(
+    settings, 'CATCH_SEARCH_COUNT_MODE', COUNT_MODE_EXACT)
+CATCH_SEARCH_COUNT_MODE_BY_CONSUMER = getattr(
+    settings, 'CATCH_SEARCH_COUNT_MODE_BY_CONSUMER', {})
+CATCH_SEARCH_COUNT_CACHE_TTL = getattr(
+    settings, 'CATCH_SEARCH_COUNT_CACHE_TTL', 30)
+CATCH_SEARCH_CACHE_ALIAS = getattr(
+    settings, 'CATCH_SEARCH_CACHE_ALIAS', 'default')
+
+# seconds a search response is cached; 0 turns the cache off
+CATCH_SEARCH_CACHE_TTL = getattr(settings, 'CATCH_SEARCH_CACHE_TTL', 0)
+
+# max number of searches in one _msearch request
+CATCH_MSEARCH_LIMIT = getattr(settings, 'CATCH_MSEARCH_LIMIT', 20)
+
+# runs of a search statement in a connection before it's prepared on the
+# server; None is off. needs server-side binding, see settings/base.py
+CATCH_SEARCH_PREPARE_THRESHOLD = getattr(
+    settings, 'CATCH_SEARCH_PREPARE_THRESHOLD', None)
+
+# replica db aliases and their weight, for search and read-only crud
+CATCH_DB_REPLICA_WEIGHTS = getattr(settings, 'CATCH_DB_REPLICA_WEIGHTS', {})
+# seconds a user reads from default after they wrote
+CATCH_DB_REPLICA_STICKY_SECONDS = getattr(
+    settings, 'CATCH_DB_REPLICA_STICKY_SECONDS', 5)
+
+# seconds the changes feed stays behind now, for in-flight writes to commit
+CATCH_CHANGES_FEED_LAG = getattr(settings, 'CATCH_CHANGES_FEED_LAG', 2)
+
+# default number of values in a _suggest response
+CATCH_SUGGEST_LIMIT = getattr(settings, 'CATCH_SUGGEST_LIMIT', 10)
+
+# async views for search and crud reads; for asgi deploys
+CATCH_ASYNC_VIEWS = getattr(settings, 'CATCH_ASYNC_VIEWS', False)
+
+# postgres text search config for stored search vectors and `text` searches
+CATCH_TEXT_SEARCH_CONFIG = getattr(
+    settings, 'CATCH_TEXT_SEARCH_CONFIG', 'english')
+CATCH_TEXT_SEARCH_CONFIG_BY_PLATFORM = getattr(
+    settings, 'CATCH_TEXT_SEARCH_CONFIG_BY_PLATFORM', {})
+
 # default platform for annotatorjs annotations
 CATCH_DEFAULT_PLATFORM_NAME = getattr(
     settings, 'CATCH_DEFAULT_PLATFORM_NAME')
@@ -5,7 +5,9 @@ import dateutil
 import dateutil.parser
 from django.conf import settings
 from django.db import DatabaseError, DataError, IntegrityError, transaction
+from django.db.backends.postgresql.psycopg_any import NumericRange
 from django.db.models import Q
+from django.utils import timezone
 
 from .anno_defaults import (
     ANNO,
@@ -28,8 +30,13 @@ from .errors import (
 )
 from .json_models import Catcha
 from .models import Anno, Tag, Target
-from .search import query_userid, query_username
-from .utils import generate_uid
+from .search import (
+    bump_search_cache_version,
+    query_userid,
+    query_username,
+    search_vector_for,
+)
+from .utils import generate_uid, selector_ranges, selector_region
 
 logger = logging.getLogger(__name__)
 
@@ -43,10 +50,30 @@ logger = logging.getLogger(__name__)
 
 class CRUD(object):
     @classmethod
-    def get_anno(cls, anno_id):
-        """filters out the soft deleted instances."""
+    def get_anno(cls, anno_id, with_total_replies=False):
+        """filters out the soft deleted instances.
+
+        with_total_replies=True counts replies in the same query, for reads.
+        """
+        query = Anno._default_manager.all()
+        if with_total_replies:
+            query = query.with_total_replies()
+        try:
+            anno = query.get(pk=anno_id)
+        except Anno.DoesNotExist:
+            return None
+        if anno.anno_deleted:
+            return None
+        return anno
+
+    @classmethod
+    async def aget_anno(cls, anno_id, with_total_replies=False):
+        """async version of get_anno(), for views served via asgi."""
+        query = Anno._default_manager.all()
+        if with_total_replies:
+            query = query.with_total_replies()
         try:
-            anno = Anno._default_manager.get(pk=anno_id)
+            anno = await query.aget(pk=anno_id)
         except Anno.DoesNotExist:
             return None
         if anno.anno_deleted:
@@ -148,8 +175,19 @@ class CRUD(object):
                     ).format(MEDIA_TYPES, t["type"], anno.anno_id)
                 )
 
+            # selector spans, for range and region overlap searches
+            text_range, time_range = selector_ranges(t)
             t_item = Target(
-                target_source=t["source"], target_media=t["type"], anno=anno
+                target_source=t["source"],
+                target_media=t["type"],
+                anno=anno,
+                text_range=(
+                    NumericRange(*text_range, bounds="[]") if text_range else None
+                ),
+                time_range=(
+                    NumericRange(*time_range, bounds="[]") if time_range else None
+                ),
+                region=selector_region(t),
             )
             t_list.append(t_item)
 
@@ -179,6 +217,7 @@ class CRUD(object):
                     can_admin=catcha["permissions"]["can_admin"],
                     body_text=body["text"],
                     body_format=body["format"],
+                    tags=body["tags"],
                     raw=catcha,
                 )
 
@@ -198,7 +237,9 @@ class CRUD(object):
                     a.created = cls._get_original_created(catcha)
 
                 a.raw["created"] = a.created.replace(microsecond=0).isoformat()
+                a.search_vector = cls._search_vector(catcha, body)
                 a.save()
+                cls._invalidate_cached_searches(a.context_id, a.collection_id)
         except IntegrityError as e:
             msg = "integrity error creating anno({}): {}".format(catcha["id"], e)
             logger.error(msg, exc_info=True)
@@ -238,6 +279,9 @@ class CRUD(object):
         catcha["totalReplies"] = anno.total_replies
         catcha["id"] = anno.anno_id
 
+        # platform might change, searches in the old one are invalid too
+        old_platform = (anno.context_id, anno.collection_id)
+
         # update the annotation object
         anno.schema_version = catcha["schema_version"]
         anno.creator_id = catcha["creator"]["id"]
@@ -249,6 +293,7 @@ class CRUD(object):
         anno.can_admin = catcha["permissions"]["can_admin"]
         anno.body_text = body["text"]
         anno.body_format = body["format"]
+        anno.tags = body["tags"]
         anno.raw = catcha
 
         try:
@@ -266,7 +311,11 @@ class CRUD(object):
                 if body["tags"]:
                     tags = cls._create_taglist(body["tags"])
                     anno.anno_tags.set(tags)
+                anno.search_vector = cls._search_vector(catcha, body)
                 anno.save()
+                cls._invalidate_cached_searches(anno.context_id, anno.collection_id)
+                if old_platform != (anno.context_id, anno.collection_id):
+                    cls._invalidate_cached_searches(*old_platform)
         except (IntegrityError, DataError, DatabaseError) as e:
             msg = "-failed to create anno({}): {}".format(anno.anno_id, str(e))
             logger.error(msg, exc_info=True)
@@ -274,6 +323,19 @@ class CRUD(object):
         else:
             return anno
 
+    @classmethod
+    def _search_vector(cls, catcha, body):
+        """stored tsvector for body text and tags, in the platform config."""
+        platform_name = catcha.get("platform", {}).get("platform_name", None)
+        return search_vector_for(body["text"], body["tags"], platform_name)
+
+    @classmethod
+    def _invalidate_cached_searches(cls, context_id, collection_id):
+        """bumps cached search versions, once the transaction commits."""
+        transaction.on_commit(
+            lambda: bump_search_cache_version(context_id, collection_id)
+        )
+
     @classmethod
     def _delete_targets(cls, anno):
         targets = anno.target_set.all()
@@ -288,15 +350,14 @@ class CRUD(object):
             raise MissingAnnotationError("anno({}) not found".format(anno.anno_id))
 
         with transaction.atomic():
-            # delete replies as well
-            for a in anno.replies:
-                try:
-                    cls.delete_anno(a)
-                except MissingAnnotationError:
-                    pass  # ignore if already deleted
+            # delete replies as well, all levels in one query
+            Anno._default_manager.thread(anno.anno_id).exclude(
+                pk=anno.anno_id
+            ).update(anno_deleted=True, modified=timezone.now())
 
             anno.mark_as_deleted()
             anno.save()
+            cls._invalidate_cached_searches(anno.context_id, anno.collection_id)
         return anno
 
     @classmethod
@@ -529,9 +590,7 @@ class CRUD(object):
         if q:
             query = query.filter(q)
 
-        query = query.order_by("-created")
-
-        logger.debug("*************** query_len={}".format(len(query)))
+        query = query.order_by("-created").with_total_replies()
 
         return query
 
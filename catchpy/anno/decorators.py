@@ -1,28 +1,106 @@
+from functools import partial
 from functools import wraps
+from django.http import HttpResponseNotAllowed
 from django.http import JsonResponse
 from http import HTTPStatus
 
+from asgiref.sync import iscoroutinefunction
+
+from .routers import ais_recent_writer
+from .routers import amark_recent_writer
+from .routers import is_recent_writer
+from .routers import mark_recent_writer
+from .routers import replica_reads
+
+
+
+def catchjwt_error_response(request):
+    '''401 response if middleware did not authenticate request, else None.'''
+    # check that middleware added jwt info in request
+    catchjwt = getattr(request, 'catchjwt', None)
+    if catchjwt is None:
+        return JsonResponse(
+            status=HTTPStatus.UNAUTHORIZED,
+            data={'status': HTTPStatus.UNAUTHORIZED,
+                  'payload': ['looks like catchjwt middleware is not on']}
+        )
+    if catchjwt['error']:
+        return JsonResponse(
+            status=HTTPStatus.UNAUTHORIZED,
+            data={'status': HTTPStatus.UNAUTHORIZED,
+                  'payload': [catchjwt['error']]},
+        )
+    return None
 
 
 def require_catchjwt(view_func):
+    if iscoroutinefunction(view_func):
+        async def _decorator(request, *args, **kwargs):
+            response = catchjwt_error_response(request)
+            if response is None:
+                response = await view_func(request, *args, **kwargs)
+            return response
+        return wraps(view_func)(_decorator)
+
     def _decorator(request, *args, **kwargs):
-        # check that middleware added jwt info in request
-        catchjwt = getattr(request, 'catchjwt', None)
-        if catchjwt is None:
-            return JsonResponse(
-                status=HTTPStatus.UNAUTHORIZED,
-                data={'status': HTTPStatus.UNAUTHORIZED,
-                      'payload': ['looks like catchjwt middleware is not on']}
-            )
-        if catchjwt['error']:
-            return JsonResponse(
-                status=HTTPStatus.UNAUTHORIZED,
-                data={'status': HTTPStatus.UNAUTHORIZED,
-                      'payload': [catchjwt['error']]},
-            )
-
-        response = view_func(request, *args, **kwargs)
+        response = catchjwt_error_response(request)
+        if response is None:
+            response = view_func(request, *args, **kwargs)
         return response
     return wraps(view_func)(_decorator)
 
 
+def async_api_view(methods):
+    '''require_http_methods and csrf_exempt, for async views.
+
+    the django decorators only wrap coroutine views from django 5.0 on.
+    '''
+    def decorator(view_func):
+        async def _decorator(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            return await view_func(request, *args, **kwargs)
+        _decorator = wraps(view_func)(_decorator)
+        _decorator.csrf_exempt = True
+        return _decorator
+    return decorator
+
+
+def read_from_replica(view_func=None, read_methods=('GET', 'HEAD')):
+    '''`read_methods` read from a replica, if any; other methods use default.
+
+    a user that just wrote reads from default for a while, so they see
+    their own writes even if the replicas lag behind. For views that take a
+    search in a POST body, add POST to `read_methods`.
+    '''
+    if view_func is None:
+        return partial(read_from_replica, read_methods=read_methods)
+
+    def _decorator(request, *args, **kwargs):
+        user_id = request.catchjwt['userId']
+        if request.method not in read_methods:
+            response = view_func(request, *args, **kwargs)
+            mark_recent_writer(user_id)
+            return response
+
+        if is_recent_writer(user_id):
+            return view_func(request, *args, **kwargs)
+        with replica_reads():
+            return view_func(request, *args, **kwargs)
+
+    async def _async_decorator(request, *args, **kwargs):
+        user_id = request.catchjwt['userId']
+        if request.method not in read_methods:
+            response = await view_func(request, *args, **kwargs)
+            await amark_recent_writer(user_id)
+            return response
+
+        if await ais_recent_writer(user_id):
+            return await view_func(request, *args, **kwargs)
+        # async orm runs queries in a thread, with a copy of this context
+        with replica_reads():
+            return await view_func(request, *args, **kwargs)
+
+    if iscoroutinefunction(view_func):
+        return wraps(view_func)(_async_decorator)
+    return wraps(view_func)(_decorator)
@@ -73,6 +73,12 @@ class RawModelOutOfSynchError(AnnoError):
     '''raw json and model are out of synch: corrupted data!'''
     status = HTTPStatus.INTERNAL_SERVER_ERROR  # 500
 
+
+class InvalidSearchParameterError(AnnoError):
+    '''search parameter is malformed, cannot run the search.'''
+    status = HTTPStatus.BAD_REQUEST  # 400
+
+
 class UnknownResponseFormatError(AnnoError):
     '''output error not catch-webannotation nor annotatorjs.'''
     status = HTTPStatus.BAD_REQUEST  # 400
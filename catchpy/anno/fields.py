@@ -0,0 +1,48 @@
+import re
+
+from django.db.models import Field
+
+# postgres box output, corners in any order, ex: (40,60),(10,20)
+BOX_OUTPUT = re.compile(r'[-+]?[\d.]+(?:[eE][-+]?\d+)?')
+
+
+def parse_box(value):
+    '''(x1, y1, x2, y2) from postgres box text, lower-left corner first.'''
+    coords = [float(v) for v in BOX_OUTPUT.findall(value)]
+    if len(coords) != 4:
+        raise ValueError('invalid box({})'.format(value))
+    (xa, ya, xb, yb) = coords
+    return (min(xa, xb), min(ya, yb), max(xa, xb), max(ya, yb))
+
+
+class BoxField(Field):
+    '''postgres `box`, as a (x1, y1, x2, y2) tuple.
+
+    for overlap searches with a gist index, see lookups.BoxOverlap.
+    '''
+    description = 'rectangle as (x1, y1, x2, y2)'
+
+    def db_type(self, connection):
+        return 'box'
+
+    def get_placeholder(self, value, compiler, connection):
+        # box params are sent as text
+        return '%s::box'
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return parse_box(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, tuple):
+            return value
+        if isinstance(value, str):
+            return parse_box(value)
+        return tuple(float(v) for v in value)
+
+    def get_prep_value(self, value):
+        value = self.to_python(value)
+        if value is None:
+            return None
+        return '({},{}),({},{})'.format(*value)
@@ -5,6 +5,9 @@ import jsonschema
 import logging
 from pyld import jsonld
 
+from django.db.models import QuerySet
+from django.db.models import prefetch_related_objects
+
 from .errors import AnnoError
 from .errors import AnnotatorJSError
 
@@ -18,6 +21,8 @@ from .anno_defaults import PURPOSE_TAGGING
 from .anno_defaults import CATCH_ANNO_REGEXPS
 from .catch_json_schema import CATCH_JSON_SCHEMA
 from .catch_json_schema import CATCH_JSONLD_CONTEXT_OBJECT
+from .managers import ANNOTATORJS_PREFETCH
+from .models import Anno
 from .errors import InconsistentAnnotationError
 from .errors import InvalidAnnotationCreatorError
 from .errors import InvalidInputWebAnnotationError
@@ -33,10 +38,48 @@ class AnnoJS(object):
 
     main exports:
         convert_from_anno(anno): from Anno model to annotatorjs json
+        convert_from_anno_list(annos): same, for a whole search page
         convert_to_catcha(annojs): from annotatorjs json to catcha json
     '''
     TEMP_ID = 'not_availABLE'
 
+    @classmethod
+    def convert_from_anno_list(cls, anno_list):
+        '''formats a page of annotation models into annotatorjs json objects.
+
+        tags, targets, parents and reply counts are fetched for the whole
+        page at once, so the number of queries does not depend on page size.
+        returns (rows, failed), where failed is a list of {id, msg}.
+        '''
+        if isinstance(anno_list, QuerySet):
+            annos = list(anno_list.for_annotatorjs())
+        else:
+            annos = list(anno_list)
+            prefetch_related_objects(annos, *ANNOTATORJS_PREFETCH)
+            cls.fetch_total_replies(annos)
+
+        rows = []
+        failed = []
+        for anno in annos:
+            try:
+                rows.append(cls.convert_from_anno(anno))
+            except AnnotatorJSError as e:
+                failed.append({'id': anno.anno_id, 'msg': str(e)})
+        return (rows, failed)
+
+    @classmethod
+    def fetch_total_replies(cls, annos):
+        '''sets reply_count in annos that miss it, in a single query.'''
+        missing = [a.anno_id for a in annos if not hasattr(a, 'reply_count')]
+        if not missing:
+            return
+        counts = dict(Anno._default_manager.filter(
+            pk__in=missing).with_total_replies().values_list(
+                'anno_id', 'reply_count'))
+        for anno in annos:
+            if not hasattr(anno, 'reply_count'):
+                anno.reply_count = counts.get(anno.anno_id, 0)
+
     @classmethod
     def convert_from_anno(cls, anno):
         '''formats an annotation model into an annotatorjs json object.'''
@@ -91,6 +134,9 @@ class AnnoJS(object):
             annojs['uri'] = uri
 
         annojs.update(r)
+        # annotated in `text` searches that ask for highlights
+        if getattr(anno, 'text_headline', None) is not None:
+            annojs['headline'] = anno.text_headline
         return annojs
 
 
@@ -126,8 +172,9 @@ class AnnoJS(object):
             # https://www.pivotaltracker.com/story/show/152686994
             t = anno.targets[0]
 
+            # raw has the targets; serialized would count replies again
             t_wa = Catcha.fetch_target_item_by_source(
-                anno.serialized, t.target_source)
+                anno.raw, t.target_source)
 
             if t.target_media in [VIDEO, AUDIO]:
                 i_resp = cls.convert_target_video(anno, t_wa)
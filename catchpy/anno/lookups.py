@@ -0,0 +1,37 @@
+from django.db.models import CharField
+from django.db.models import Lookup
+
+from .fields import BoxField
+
+
+@CharField.register_lookup
+class Any(Lookup):
+    '''`field = ANY(%s)`, with a list of values as a single array param.
+
+    unlike `__in`, the sql is the same for any number of values.
+    '''
+    lookup_name = 'any'
+    prepare_rhs = False
+
+    def get_db_prep_lookup(self, value, connection):
+        return ('%s', [list(value)])
+
+    def as_sql(self, compiler, connection):
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        return (
+            '{} = ANY({})'.format(lhs_sql, rhs_sql),
+            list(lhs_params) + list(rhs_params))
+
+
+@BoxField.register_lookup
+class BoxOverlap(Lookup):
+    '''`field && %s::box`, the boxes have points in common; uses gist.'''
+    lookup_name = 'overlap'
+
+    def as_sql(self, compiler, connection):
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        return (
+            '{} && {}::box'.format(lhs_sql, rhs_sql),
+            list(lhs_params) + list(rhs_params))
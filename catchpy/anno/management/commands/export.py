@@ -1,6 +1,9 @@
 import json
+import textwrap
 
+from catchpy.anno.anno_defaults import CATCH_SEARCH_STREAM_CHUNK_SIZE
 from catchpy.anno.crud import CRUD
+from catchpy.anno.routers import replica_reads
 from django.core.management import BaseCommand
 
 
@@ -38,8 +41,21 @@ class Command(BaseCommand):
             required=False,
             help="comma separated list of usernames",
         )
+        parser.add_argument(
+            "--from_primary",
+            dest="from_primary",
+            action="store_true",
+            help="read from the primary db even if there are replicas",
+        )
 
     def handle(self, *args, **kwargs):
+        if kwargs["from_primary"]:
+            self.export(**kwargs)
+        else:
+            with replica_reads():  # if any
+                self.export(**kwargs)
+
+    def export(self, **kwargs):
         context_id = kwargs["context_id"]
         collection_id = kwargs["collection_id"]
         platform_name = kwargs.get("platform_name", None)
@@ -61,11 +77,21 @@ class Command(BaseCommand):
         )  # return replies and deleted
 
         # serialize results as in api search
-        resp = []
-        for a in qset:
+        # rows are read via server-side cursor and written one at a time,
+        # so memory does not grow with the size of the export
+        first = True
+        for a in qset.iterator(chunk_size=CATCH_SEARCH_STREAM_CHUNK_SIZE):
             catcha = a.serialized
             if a.anno_deleted:  # hack! have to flag it's a deleted
                 catcha["platform"]["deleted"] = True
-            resp.append(catcha)
+            self.stdout.write(
+                "{}\n{}".format(
+                    "[" if first else ",",
+                    textwrap.indent(json.dumps(catcha, indent=4), "    "),
+                ),
+                ending="",
+            )
+            first = False
 
-        print(json.dumps(resp, indent=4))
+        # same output as json.dumps(list, indent=4)
+        self.stdout.write("[]" if first else "\n]")
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("anno", "0007_auto_20230321_1732"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="anno",
+            index=models.Index(
+                fields=["-created", "-anno_id"], name="anno_created_id_idx"
+            ),
+        ),
+    ]
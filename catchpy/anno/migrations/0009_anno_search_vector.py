@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:28
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+# same document as search.search_vector_for(), html stripped with a regexp
+BACKFILL_SQL = """
+UPDATE anno_anno SET search_vector =
+    setweight(to_tsvector(%s::regconfig, regexp_replace(
+        coalesce(body_text, ''), '<[^>]*>', ' ', 'g')), 'A') ||
+    setweight(to_tsvector(%s::regconfig, coalesce((
+        SELECT string_agg(t.tag_name, ' ')
+        FROM anno_anno_anno_tags at JOIN anno_tag t ON t.id = at.tag_id
+        WHERE at.anno_id = anno_anno.anno_id), '')), 'B')
+WHERE anno_id IN (
+    SELECT anno_id FROM anno_anno
+    WHERE search_vector IS NULL {platform_filter}
+    LIMIT %s)
+"""
+
+
+def backfill_search_vector(apps, schema_editor):
+    default_config = getattr(settings, "CATCH_TEXT_SEARCH_CONFIG", "english")
+    platform_configs = getattr(settings, "CATCH_TEXT_SEARCH_CONFIG_BY_PLATFORM", {})
+
+    batches = [
+        (
+            BACKFILL_SQL.format(
+                platform_filter="AND raw->'platform'->>'platform_name' = %s"
+            ),
+            [config, config, platform_name, BATCH_SIZE],
+        )
+        for (platform_name, config) in platform_configs.items()
+    ]
+    batches.append(
+        (
+            BACKFILL_SQL.format(platform_filter=""),
+            [default_config, default_config, BATCH_SIZE],
+        )
+    )
+
+    # batches commit one at a time, not to hold locks on the whole table
+    with schema_editor.connection.cursor() as cursor:
+        for sql, params in batches:
+            cursor.execute(sql, params)
+            while cursor.rowcount > 0:
+                cursor.execute(sql, params)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("anno", "0008_anno_created_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="anno",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(null=True),
+        ),
+        # fill up before building the index, it's faster
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="anno",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="anno_search_vector_gin"
+            ),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:30
+
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+BACKFILL_SQL = """
+UPDATE anno_anno SET
+    platform_name = raw->'platform'->>'platform_name',
+    context_id = raw->'platform'->>'context_id',
+    collection_id = raw->'platform'->>'collection_id',
+    target_source_id = raw->'platform'->>'target_source_id'
+WHERE anno_id > %s AND anno_id <= %s
+"""
+
+
+def backfill_platform_columns(apps, schema_editor):
+    # walk the table by anno_id, committing one batch at a time
+    last_anno_id = ""
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                "SELECT max(anno_id) FROM (SELECT anno_id FROM anno_anno "
+                "WHERE anno_id > %s ORDER BY anno_id LIMIT %s) AS batch",
+                [last_anno_id, BATCH_SIZE],
+            )
+            upper_anno_id = cursor.fetchone()[0]
+            if upper_anno_id is None:
+                break
+            cursor.execute(BACKFILL_SQL, [last_anno_id, upper_anno_id])
+            last_anno_id = upper_anno_id
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("anno", "0009_anno_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="anno",
+            name="collection_id",
+            field=models.CharField(max_length=2048, null=True),
+        ),
+        migrations.AddField(
+            model_name="anno",
+            name="context_id",
+            field=models.CharField(max_length=2048, null=True),
+        ),
+        migrations.AddField(
+            model_name="anno",
+            name="platform_name",
+            field=models.CharField(max_length=2048, null=True),
+        ),
+        migrations.AddField(
+            model_name="anno",
+            name="target_source_id",
+            field=models.CharField(max_length=2048, null=True),
+        ),
+        # fill up before building the indexes, it's faster
+        migrations.RunPython(backfill_platform_columns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="anno",
+            index=models.Index(
+                fields=["context_id", "collection_id", "-created", "-anno_id"],
+                name="anno_context_collection_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="anno",
+            index=models.Index(
+                fields=["target_source_id", "-created"],
+                name="anno_target_source_id_idx",
+            ),
+        ),
+        # searches do not use the raw->'platform' expression indexes anymore
+        migrations.RunSQL(
+            "DROP INDEX IF EXISTS idx_raw_contextid",
+            "CREATE INDEX idx_raw_contextid on anno_anno((raw->'platform'->'context_id'))",
+        ),
+        migrations.RunSQL(
+            "DROP INDEX IF EXISTS idx_raw_collectionid",
+            "CREATE INDEX idx_raw_collectionid on anno_anno((raw->'platform'->'collection_id'))",
+        ),
+        migrations.RunSQL(
+            "DROP INDEX IF EXISTS idx_raw_targetsourceid",
+            "CREATE INDEX idx_raw_targetsourceid on anno_anno((raw->'platform'->'target_source_id'))",
+        ),
+    ]
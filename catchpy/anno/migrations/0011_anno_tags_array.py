@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:35
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+BACKFILL_SQL = """
+UPDATE anno_anno SET tags = coalesce((
+    SELECT array_agg(t.tag_name ORDER BY at.id)
+    FROM anno_anno_anno_tags at JOIN anno_tag t ON t.id = at.tag_id
+    WHERE at.anno_id = anno_anno.anno_id), '{}')
+WHERE anno_id > %s AND anno_id <= %s
+"""
+
+
+def backfill_tags(apps, schema_editor):
+    # walk the table by anno_id, committing one batch at a time
+    last_anno_id = ""
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                "SELECT max(anno_id) FROM (SELECT anno_id FROM anno_anno "
+                "WHERE anno_id > %s ORDER BY anno_id LIMIT %s) AS batch",
+                [last_anno_id, BATCH_SIZE],
+            )
+            upper_anno_id = cursor.fetchone()[0]
+            if upper_anno_id is None:
+                break
+            cursor.execute(BACKFILL_SQL, [last_anno_id, upper_anno_id])
+            last_anno_id = upper_anno_id
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("anno", "0010_anno_platform_columns"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="anno",
+            name="tags",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.CharField(max_length=256),
+                default=list,
+                null=True,
+                size=None,
+            ),
+        ),
+        # fill up before building the index, it's faster
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="anno",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["tags"], name="anno_tags_gin"
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:39
+
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+BACKFILL_SQL = """
+UPDATE anno_anno SET is_public = coalesce(array_length(can_read, 1), 0) = 0
+WHERE anno_id > %s AND anno_id <= %s
+"""
+
+
+def backfill_is_public(apps, schema_editor):
+    # walk the table by anno_id, committing one batch at a time
+    last_anno_id = ""
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                "SELECT max(anno_id) FROM (SELECT anno_id FROM anno_anno "
+                "WHERE anno_id > %s ORDER BY anno_id LIMIT %s) AS batch",
+                [last_anno_id, BATCH_SIZE],
+            )
+            upper_anno_id = cursor.fetchone()[0]
+            if upper_anno_id is None:
+                break
+            cursor.execute(BACKFILL_SQL, [last_anno_id, upper_anno_id])
+            last_anno_id = upper_anno_id
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("anno", "0011_anno_tags_array"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="anno",
+            name="is_public",
+            field=models.BooleanField(default=False),
+        ),
+        # fill up before building the indexes, it's faster
+        migrations.RunPython(backfill_is_public, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="anno",
+            index=models.Index(
+                condition=models.Q(("anno_deleted", False), ("is_public", True)),
+                fields=["-created", "-anno_id"],
+                name="anno_public_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="anno",
+            index=models.Index(
+                condition=models.Q(("anno_deleted", False), ("is_public", True)),
+                fields=["context_id", "collection_id", "-created", "-anno_id"],
+                name="anno_public_context_idx",
+            ),
+        ),
+    ]
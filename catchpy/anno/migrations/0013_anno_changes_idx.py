@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("anno", "0012_anno_is_public"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="anno",
+            index=models.Index(
+                fields=["context_id", "collection_id", "modified", "anno_id"],
+                name="anno_changes_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:40
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations
+from django.db.backends.postgresql.psycopg_any import NumericRange
+
+from catchpy.anno.utils import selector_ranges
+
+BATCH_SIZE = 2000
+
+# targets that might have text positions or media fragments
+RANGE_MEDIAS = ["Text", "Video", "Audio"]
+
+
+def backfill_target_ranges(apps, schema_editor):
+    Target = apps.get_model("anno", "Target")
+    targets = (
+        Target.objects.filter(target_media__in=RANGE_MEDIAS)
+        .select_related("anno")
+        .only("id", "target_source", "target_media", "anno__raw")
+        .order_by("id")
+    )
+
+    last_id = 0
+    batch = list(targets.filter(id__gt=last_id)[:BATCH_SIZE])
+    while batch:
+        for t in batch:
+            # the raw target item this row was created from
+            items = t.anno.raw.get("target", {}).get("items", [])
+            item = next(
+                (
+                    i
+                    for i in items
+                    if i.get("source") == t.target_source
+                    and i.get("type") == t.target_media
+                ),
+                {},
+            )
+            text_range, time_range = selector_ranges(item)
+            if text_range:
+                t.text_range = NumericRange(*text_range, bounds="[]")
+            if time_range:
+                t.time_range = NumericRange(*time_range, bounds="[]")
+        Target.objects.bulk_update(batch, ["text_range", "time_range"])
+        last_id = batch[-1].id
+        batch = list(targets.filter(id__gt=last_id)[:BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("anno", "0013_anno_changes_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="target",
+            name="text_range",
+            field=django.contrib.postgres.fields.ranges.IntegerRangeField(null=True),
+        ),
+        migrations.AddField(
+            model_name="target",
+            name="time_range",
+            field=django.contrib.postgres.fields.ranges.DecimalRangeField(null=True),
+        ),
+        # fill up before building the indexes, it's faster
+        migrations.RunPython(backfill_target_ranges, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="target",
+            index=django.contrib.postgres.indexes.GistIndex(
+                fields=["text_range"], name="target_text_range_gist"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="target",
+            index=django.contrib.postgres.indexes.GistIndex(
+                fields=["time_range"], name="target_time_range_gist"
+            ),
+        ),
+    ]
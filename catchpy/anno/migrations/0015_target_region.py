@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:15
+
+import catchpy.anno.fields
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+from catchpy.anno.utils import selector_region
+
+BATCH_SIZE = 2000
+
+
+def backfill_target_region(apps, schema_editor):
+    Target = apps.get_model("anno", "Target")
+    targets = (
+        Target.objects.filter(target_media="Image")
+        .select_related("anno")
+        .only("id", "target_source", "target_media", "anno__raw")
+        .order_by("id")
+    )
+
+    last_id = 0
+    batch = list(targets.filter(id__gt=last_id)[:BATCH_SIZE])
+    while batch:
+        for t in batch:
+            # the raw target item this row was created from
+            items = t.anno.raw.get("target", {}).get("items", [])
+            item = next(
+                (
+                    i
+                    for i in items
+                    if i.get("source") == t.target_source
+                    and i.get("type") == t.target_media
+                ),
+                {},
+            )
+            t.region = selector_region(item)
+        Target.objects.bulk_update(batch, ["region"])
+        last_id = batch[-1].id
+        batch = list(targets.filter(id__gt=last_id)[:BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("anno", "0014_target_ranges"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="target",
+            name="region",
+            field=catchpy.anno.fields.BoxField(null=True),
+        ),
+        # fill up before building the index, it's faster
+        migrations.RunPython(backfill_target_region, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="target",
+            index=django.contrib.postgres.indexes.GistIndex(
+                fields=["region"], name="target_region_gist"
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:50
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("anno", "0015_target_region"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="anno",
+            index=models.Index(
+                models.F("context_id"),
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("creator_name"),
+                    name="text_pattern_ops",
+                ),
+                name="anno_context_creator_name_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tag",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("tag_name"),
+                    name="text_pattern_ops",
+                ),
+                name="tag_name_prefix_idx",
+            ),
+        ),
+    ]
@@ -28,23 +28,38 @@ from django.db.models import CASCADE
 from django.db.models import BooleanField
 from django.db.models import CharField
 from django.db.models import DateTimeField
+from django.db.models import F
 from django.db.models import ForeignKey
+from django.db.models import Index
 from django.db.models import JSONField
-from django.db.models import Manager
 from django.db.models import ManyToManyField
 from django.db.models import Model
+from django.db.models import Q
 from django.db.models import TextField
+from django.db.models.functions import Upper
 
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.fields import DecimalRangeField
+from django.contrib.postgres.fields import IntegerRangeField
 from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import GistIndex
+from django.contrib.postgres.indexes import OpClass
+from django.contrib.postgres.search import SearchVectorField
 
 from django.conf import settings
 
+from . import lookups  # noqa: F401 registers custom lookups
+from .fields import BoxField
+from .managers import AnnoManager
 from .managers import SearchManager
 
 
 logger = logging.getLogger(__name__)
 
+# raw['platform'] properties stored as columns in Anno
+PLATFORM_PROPERTIES = [
+    'platform_name', 'context_id', 'collection_id', 'target_source_id']
+
 
 class Anno(Model):
     created = DateTimeField(db_index=True, auto_now_add=True, null=False)
@@ -61,11 +76,15 @@ class Anno(Model):
     # comment to a parent annotation
     anno_reply_to = ForeignKey('Anno', null=True, blank=True, on_delete=CASCADE)
     anno_tags = ManyToManyField('Tag', blank=True)
+    # copy of anno_tags names, for searches; set by crud on create and update
+    tags = ArrayField(CharField(max_length=256), null=True, default=list)
     # permissions are lists of user_ids, blank means public
     can_read = ArrayField(CharField(max_length=128), null=True, default=list)
     can_update = ArrayField(CharField(max_length=128), null=True, default=list)
     can_delete = ArrayField(CharField(max_length=128), null=True, default=list)
     can_admin = ArrayField(CharField(max_length=128), null=True, default=list)
+    # blank can_read, precomputed on save() for the search permission filter
+    is_public = BooleanField(default=False)
 
     # support for only one _text_ body
     # max length for body_text is restricted in django request
@@ -83,8 +102,19 @@ class Anno(Model):
 
     raw = JSONField()
 
+    # copies of raw['platform'] properties, kept in sync on save()
+    # searches filter on these, see 'platform' at the bottom
+    platform_name = CharField(max_length=2048, null=True)
+    context_id = CharField(max_length=2048, null=True)
+    collection_id = CharField(max_length=2048, null=True)
+    target_source_id = CharField(max_length=2048, null=True)
+
+    # tsvector for `text` searches: html-stripped body_text and tags
+    # built on create and update, see search.search_vector_for()
+    search_vector = SearchVectorField(null=True)
+
     # default model manager
-    objects = Manager()
+    objects = AnnoManager()
 
     # TODO: manager for custom searches
     # http://stackoverflow.com/a/30941292
@@ -103,6 +133,50 @@ class Anno(Model):
                 fields=['raw'],
                 name='anno_raw_gin',
             ),
+            # searches within a course/assignment, most recent first
+            Index(
+                fields=['context_id', 'collection_id', '-created', '-anno_id'],
+                name='anno_context_collection_idx',
+            ),
+            Index(
+                fields=['target_source_id', '-created'],
+                name='anno_target_source_id_idx',
+            ),
+            # most searches are by non-admins, on public annotations
+            Index(
+                fields=['-created', '-anno_id'],
+                condition=Q(anno_deleted=False, is_public=True),
+                name='anno_public_created_idx',
+            ),
+            Index(
+                fields=['context_id', 'collection_id', '-created', '-anno_id'],
+                condition=Q(anno_deleted=False, is_public=True),
+                name='anno_public_context_idx',
+            ),
+            GinIndex(
+                fields=['tags'],
+                name='anno_tags_gin',
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='anno_search_vector_gin',
+            ),
+            # search sort order, also used for keyset pagination
+            Index(
+                fields=['-created', '-anno_id'],
+                name='anno_created_id_idx',
+            ),
+            # changes feed order, deleted included; also modified date range
+            Index(
+                fields=['context_id', 'collection_id', 'modified', 'anno_id'],
+                name='anno_changes_idx',
+            ),
+            # case-insensitive prefix match in suggest, within a context
+            Index(
+                F('context_id'),
+                OpClass(Upper('creator_name'), name='text_pattern_ops'),
+                name='anno_context_creator_name_idx',
+            ),
         ]
 
     def __repr__(self):
@@ -111,8 +185,27 @@ class Anno(Model):
     def __str__(self):
         return self.__repr__()
 
+    def save(self, *args, **kwargs):
+        self.sync_platform()
+        self.is_public = not self.can_read
+        super().save(*args, **kwargs)
+
+    def sync_platform(self):
+        '''copy raw['platform'] properties into their columns.'''
+        platform = None
+        if isinstance(self.raw, dict):
+            platform = self.raw.get('platform', None)
+        if not isinstance(platform, dict):
+            platform = {}
+        for prop in PLATFORM_PROPERTIES:
+            value = platform.get(prop, None)
+            setattr(self, prop, None if value is None else str(value))
+
     @property
     def total_replies(self):
+        # precomputed by AnnoQuerySet.with_total_replies()
+        if hasattr(self, 'reply_count'):
+            return self.reply_count
         #return self.anno_set.count()
         return self.anno_set.all().filter(anno_deleted=False).count()
 
@@ -134,11 +227,19 @@ class Anno(Model):
 
     @property
     def serialized(self):
+        return self.serialize()
+
+    def serialize(self, total_replies=None):
+        '''catcha json for this anno; `total_replies` skips the count.'''
         s = self.raw.copy()
-        s['totalReplies'] = self.total_replies
+        s['totalReplies'] = (
+            self.total_replies if total_replies is None else total_replies)
         s['created'] = self.created.replace(microsecond=0).isoformat()
         s['modified'] = self.modified.replace(microsecond=0).isoformat()
         s['id'] = self.anno_id
+        # annotated in `text` searches that ask for highlights
+        if getattr(self, 'text_headline', None) is not None:
+            s['headline'] = self.text_headline
         return s
 
     def permissions_for_user(self, user):
@@ -180,6 +281,15 @@ class Tag(Model):
     tag_name = CharField(max_length=256, unique=True, null=False)
     created = DateTimeField(auto_now_add=True, null=False)
 
+    class Meta:
+        indexes = [
+            # case-insensitive prefix match in suggest
+            Index(
+                OpClass(Upper('tag_name'), name='text_pattern_ops'),
+                name='tag_name_prefix_idx',
+            ),
+        ]
+
     def __repr__(self):
         return self.tag_name
 
@@ -205,6 +315,23 @@ class Target(Model):
     # delete all targets when deleting anno
     anno = ForeignKey('Anno', on_delete=CASCADE)
 
+    # spans of the target selectors, for overlap searches; set by crud from
+    # raw['target'], see utils.selector_ranges()
+    # TextPositionSelector offsets, for text
+    text_range = IntegerRangeField(null=True)
+    # media fragment `t=start,end` in seconds, for video and audio
+    time_range = DecimalRangeField(null=True)
+    # box around media fragments `xywh=x,y,w,h` in pixels, for images;
+    # see utils.selector_region()
+    region = BoxField(null=True)
+
+    class Meta:
+        indexes = [
+            GistIndex(fields=['text_range'], name='target_text_range_gist'),
+            GistIndex(fields=['time_range'], name='target_time_range_gist'),
+            GistIndex(fields=['region'], name='target_region_gist'),
+        ]
+
     def __repr__(self):
         return '({}_{})'.format(self.target_source, self.id)
 
@@ -0,0 +1,88 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import caches
+
+from .anno_defaults import CATCH_DB_REPLICA_WEIGHTS
+from .anno_defaults import CATCH_DB_REPLICA_STICKY_SECONDS
+from .anno_defaults import CATCH_SEARCH_CACHE_ALIAS
+
+
+# replica that reads go to, set per request or command by replica_reads()
+_read_alias = ContextVar('catchpy_read_alias', default=None)
+
+
+class ReplicaRouter(object):
+    '''reads within replica_reads() go to a replica; all else to default.'''
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()  # None is default
+
+    def db_for_write(self, model, **hints):
+        # even for objects read from a replica
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replicas are copies of default
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get the schema from default, via replication
+        return db == 'default'
+
+
+def choose_replica():
+    '''alias of a replica, picked by weight; None if no replicas.'''
+    aliases = [a for (a, w) in CATCH_DB_REPLICA_WEIGHTS.items() if w > 0]
+    if not aliases:
+        return None
+    weights = [CATCH_DB_REPLICA_WEIGHTS[a] for a in aliases]
+    return random.choices(aliases, weights=weights)[0]
+
+
+@contextmanager
+def replica_reads(alias=None):
+    '''reads in the block go to `alias`, or to a replica picked by weight.
+
+    the replica is picked once, so all reads in the block see the same copy.
+    '''
+    token = _read_alias.set(alias or choose_replica())
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def _sticky_key(user_id):
+    return 'catchpy:replica:sticky:{}'.format(
+        hashlib.sha1(str(user_id).encode('utf-8')).hexdigest())
+
+
+def mark_recent_writer(user_id):
+    '''next reads by `user_id` stay on default, not to miss their writes.'''
+    if CATCH_DB_REPLICA_WEIGHTS and CATCH_DB_REPLICA_STICKY_SECONDS > 0:
+        caches[CATCH_SEARCH_CACHE_ALIAS].set(
+            _sticky_key(user_id), True, CATCH_DB_REPLICA_STICKY_SECONDS)
+
+
+def is_recent_writer(user_id):
+    '''True if `user_id` wrote within the sticky window.'''
+    if not CATCH_DB_REPLICA_WEIGHTS:
+        return False
+    return caches[CATCH_SEARCH_CACHE_ALIAS].get(_sticky_key(user_id)) is not None
+
+
+async def amark_recent_writer(user_id):
+    '''async version of mark_recent_writer().'''
+    if CATCH_DB_REPLICA_WEIGHTS and CATCH_DB_REPLICA_STICKY_SECONDS > 0:
+        await caches[CATCH_SEARCH_CACHE_ALIAS].aset(
+            _sticky_key(user_id), True, CATCH_DB_REPLICA_STICKY_SECONDS)
+
+
+async def ais_recent_writer(user_id):
+    '''async version of is_recent_writer().'''
+    if not CATCH_DB_REPLICA_WEIGHTS:
+        return False
+    sticky = await caches[CATCH_SEARCH_CACHE_ALIAS].aget(_sticky_key(user_id))
+    return sticky is not None
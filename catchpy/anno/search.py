@@ -1,6 +1,43 @@
+import base64
+import binascii
+import hashlib
+import json
 import logging
+import math
+import time
+import uuid
+from contextlib import contextmanager
 
+import iso8601
+from asgiref.sync import sync_to_async
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchVector
+from django.core.cache import caches
+from django.db import connections
+from django.db import router
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from django.db.models import Count
+from django.db.models import Exists
+from django.db.models import OuterRef
 from django.db.models import Q
+from django.db.models import Value
+from django.db.models import Window
+from django.utils.html import strip_tags
+
+from .anno_defaults import CATCH_RESPONSE_LIMIT
+from .anno_defaults import CATCH_SEARCH_CACHE_ALIAS
+from .anno_defaults import CATCH_SEARCH_COUNT_CACHE_TTL
+from .anno_defaults import CATCH_SEARCH_PREPARE_THRESHOLD
+from .anno_defaults import CATCH_TEXT_SEARCH_CONFIG
+from .anno_defaults import CATCH_TEXT_SEARCH_CONFIG_BY_PLATFORM
+from .anno_defaults import COUNT_MODE_CACHED
+from .anno_defaults import COUNT_MODE_ESTIMATED
+from .anno_defaults import COUNT_MODE_EXACT
+from .anno_defaults import COUNT_MODE_NONE
+from .anno_defaults import COUNT_MODE_WINDOW
+from .errors import InvalidSearchParameterError
+from .models import Target
 
 
 # from https://djangosnippets.org/snippets/1700/
@@ -28,24 +65,442 @@ def dynamic_lookup_valuelist(field, values, op='or', lookup=None):
     return q if q else Q()
 
 
+def normalize_valuelist(values):
+    '''distinct, non-empty values as strings, in the order they came.'''
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+    result = []
+    for v in values:
+        if v is None or v == '':
+            continue
+        v = str(v)
+        if v not in result:
+            result.append(v)
+    return result
+
+
+def any_lookup_valuelist(field, values):
+    '''`field = ANY(array)`; same sql for any number of values.'''
+    values = normalize_valuelist(values)
+    if not values:
+        return Q()
+    return Q(**{'{}__any'.format(field): values})
+
+
+def query_can_read(userid):
+    '''annos readable by `userid`: public, or listed in can_read.'''
+    return Q(is_public=True) | Q(can_read__contains=[userid])
+
+
 def query_userid(userid_params):
-    return dynamic_lookup_valuelist('creator_id', userid_params)
+    return any_lookup_valuelist('creator_id', userid_params)
 
 
 def query_username(username_params):
-    return dynamic_lookup_valuelist('creator_name', username_params)
+    return any_lookup_valuelist('creator_name', username_params)
 
 
 def query_tags(tags_params):
-    return dynamic_lookup_valuelist(
-        'anno_tags__tag_name', tags_params)
+    '''annos with any of the tags, as `tags && array[...]`.'''
+    tags = normalize_valuelist(tags_params)
+    return Q(tags__overlap=tags) if tags else Q()
 
 
 def query_target_sources(target_params):
-    return dynamic_lookup_valuelist('target__target_source', target_params)
+    return any_lookup_valuelist('target__target_source', target_params)
 
 
 def query_target_medias(media_params):
-    return dynamic_lookup_valuelist('target__target_media', media_params)
+    return any_lookup_valuelist('target__target_media', media_params)
+
+
+def query_target_range(range_start=None, range_end=None):
+    '''annos with a target overlapping the window [range_start, range_end].
+
+    the window is in text positions for text targets and seconds for video
+    and audio; either end can be None for open. An exists subquery, so an
+    anno with many overlapping targets is returned once.
+    '''
+    window = NumericRange(range_start, range_end, bounds='[]')
+    text_window = NumericRange(
+        None if range_start is None else math.floor(range_start),
+        None if range_end is None else math.ceil(range_end),
+        bounds='[]')
+    targets = Target._default_manager.filter(anno=OuterRef('pk')).filter(
+        Q(text_range__overlap=text_window) | Q(time_range__overlap=window))
+    return Q(Exists(targets))
+
+
+def query_target_region(x, y, w, h):
+    '''annos with an image target region overlapping box x,y,w,h.'''
+    targets = Target._default_manager.filter(
+        anno=OuterRef('pk'), region__overlap=(x, y, x + w, y + h))
+    return Q(Exists(targets))
+
+
+def text_search_config(platform_name=None):
+    '''postgres text search config for annotations in `platform_name`.'''
+    return CATCH_TEXT_SEARCH_CONFIG_BY_PLATFORM.get(
+        platform_name, CATCH_TEXT_SEARCH_CONFIG)
+
+
+def search_vector_for(body_text, tags, platform_name=None):
+    '''expression for the stored `search_vector` of an anno.
+
+    html is stripped from body_text; body text weighs more than tags.
+    '''
+    config = text_search_config(platform_name)
+    return (
+        SearchVector(
+            Value(strip_tags(body_text or '')), weight='A', config=config)
+        + SearchVector(Value(' '.join(tags)), weight='B', config=config))
+
+
+def text_search_query(text, platform_name=None):
+    '''full-text query for `text` param, matched against `search_vector`.'''
+    return SearchQuery(text, config=text_search_config(platform_name))
+
+
+# facet name -> field grouped for counts
+FACET_FIELDS = {
+    'tag': 'anno_tags__tag_name',
+    'userid': 'creator_id',
+    'media': 'target__target_media',
+    'target_source': 'target__target_source',
+}
+
+
+def facet_counts(query, facets, limit=CATCH_RESPONSE_LIMIT):
+    '''number of annotations per value of each facet, in search `query`.
+
+    one aggregate query per facet; values sorted by count, up to `limit`.
+    '''
+    for facet in facets:
+        if facet not in FACET_FIELDS:
+            raise InvalidSearchParameterError(
+                'facet should be in ({}), found({})'.format(
+                    ','.join(FACET_FIELDS), facet))
+
+    # group over the search as a subquery, so filters on tags or targets
+    # don't restrict the values counted
+    annos = query.model._default_manager.filter(
+        pk__in=query.order_by().values('pk'))
+    result = {}
+    for facet in facets:
+        field = FACET_FIELDS[facet]
+        rows = annos.values(field).annotate(
+            total=Count('pk', distinct=True)).order_by('-total', field)
+        result[facet] = [
+            {'value': row[field], 'count': row['total']}
+            for row in rows[:limit + 1] if row[field] is not None][:limit]
+    return result
+
+
+SUGGEST_FIELDS = {
+    'tag': 'anno_tags__tag_name',
+    'username': 'creator_name',
+}
+
+
+def suggest_values(query, field, prefix='', limit=10):
+    '''most frequent values of `field` starting with `prefix`, in `query`.
+
+    the prefix match is case-insensitive, as upper(value) LIKE 'PREFIX%',
+    served by text_pattern_ops indexes on upper(tag_name), and on
+    (context_id, upper(creator_name)).
+    '''
+    if field not in SUGGEST_FIELDS:
+        raise InvalidSearchParameterError(
+            'suggest field should be in ({}), found({})'.format(
+                ','.join(SUGGEST_FIELDS), field))
+
+    name = SUGGEST_FIELDS[field]
+    if prefix:
+        query = query.filter(**{'{}__istartswith'.format(name): prefix})
+    rows = query.values(name).annotate(
+        total=Count('pk', distinct=True)).order_by('-total', name)
+    return [
+        {'value': row[name], 'count': row['total']}
+        for row in rows[:limit + 1] if row[name] is not None][:limit]
+
+
+def encode_cursor(anno, field='created'):
+    '''opaque keyset cursor pointing right after `anno` in search order.
+
+    `field` is the date the rows are sorted by, with anno_id breaking ties.
+    '''
+    key = json.dumps([getattr(anno, field).isoformat(), anno.anno_id])
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    '''returns (created, anno_id) encoded in `cursor`.'''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = base64.urlsafe_b64decode(padded.encode('ascii'))
+        (created, anno_id) = json.loads(key.decode('utf-8'))
+        return (iso8601.parse_date(created), str(anno_id))
+    except (binascii.Error, UnicodeError, ValueError, TypeError) as e:
+        raise InvalidSearchParameterError(
+            'invalid search cursor({}): {}'.format(cursor, e))
+
+
+def query_after_cursor(cursor):
+    '''rows after cursor when sorted by (created, anno_id) descending.'''
+    (created, anno_id) = decode_cursor(cursor)
+    return Q(created__lt=created) | Q(created=created, anno_id__lt=anno_id)
+
+
+def query_changed_since(since):
+    '''rows after `since` when sorted by (modified, anno_id) ascending.'''
+    (modified, anno_id) = decode_cursor(since)
+    return Q(modified__gt=modified) | Q(modified=modified, anno_id__gt=anno_id)
+
+
+def query_date_range(field, after=None, before=None):
+    '''rows with datetime `field` in [after, before); either can be None.'''
+    q = Q()
+    if after is not None:
+        q &= Q(**{'{}__gte'.format(field): after})
+    if before is not None:
+        q &= Q(**{'{}__lt'.format(field): before})
+    return q
+
+
+def count_search_results(query, mode=COUNT_MODE_EXACT):
+    '''total of rows in search `query`, computed as `mode` says.
+
+    returns None for mode `none`. mode `window` counts along with the page,
+    see window_total(); here it's an exact count, for when there is no page.
+    '''
+    if mode in (COUNT_MODE_EXACT, COUNT_MODE_WINDOW):
+        return query.count()
+    elif mode == COUNT_MODE_CACHED:
+        return cached_count(query)
+    elif mode == COUNT_MODE_ESTIMATED:
+        return estimated_count(query)
+    elif mode == COUNT_MODE_NONE:
+        return None
+    else:
+        raise InvalidSearchParameterError(
+            'unknown count mode({})'.format(mode))
+
+
+async def acount_search_results(query, mode=COUNT_MODE_EXACT):
+    '''async version of count_search_results().'''
+    if mode in (COUNT_MODE_EXACT, COUNT_MODE_WINDOW):
+        return await query.acount()
+    elif mode == COUNT_MODE_NONE:
+        return None
+    # cached and estimated go through the sync cache and cursor
+    return await sync_to_async(count_search_results)(query, mode)
+
+
+def with_window_total(query):
+    '''annotates `window_total`, COUNT(*) OVER () of all rows in `query`.
+
+    the total comes with each row of a page sliced from `query`, so page and
+    total are fetched in one statement.
+    '''
+    return query.annotate(window_total=Window(Count('*')))
+
+
+def window_total(rows, query):
+    '''total from the page `rows` of with_window_total(`query`).'''
+    if rows:
+        return rows[0].window_total
+    # no row to read the total from: `limit=0`, past the last page, or
+    # really no match; only a count tells these apart
+    return query.count()
+
+
+async def awindow_total(rows, query):
+    '''async version of window_total().'''
+    if rows:
+        return window_total(rows, query)
+    return await query.acount()
+
+
+def cached_count(query):
+    '''exact count, cached per normalized filter set.'''
+    # the compiled sql and its params are the normalized filter set
+    (sql, params) = query.order_by().query.sql_with_params()
+    key = 'catchpy:count:{}'.format(
+        hashlib.sha1(repr((sql, params)).encode('utf-8')).hexdigest())
+
+    cache = caches[CATCH_SEARCH_CACHE_ALIAS]
+    total = cache.get(key)
+    if total is None:
+        total = query.count()
+        cache.set(key, total, CATCH_SEARCH_COUNT_CACHE_TTL)
+    return total
+
+
+def estimated_count(query):
+    '''row estimate from postgres planner; no rows are scanned.'''
+    plan = json.loads(query.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def read_connection():
+    '''connection search reads go to; a replica within replica_reads().'''
+    return connections[router.db_for_read(Target)]
+
+
+class QueryLog(object):
+    '''execute wrapper that keeps the sql, params and time of each query.
+
+    used as `with connection.execute_wrapper(query_log):`.
+    '''
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': context['connection'].ops.last_executed_query(
+                    context['cursor'], sql, params),
+                'raw_sql': sql,
+                'params': params,
+                'time': time.perf_counter() - start,
+            })
+
+
+def explain_analyze(sql, params=None):
+    '''EXPLAIN (ANALYZE, BUFFERS) plan for a select, as json.
+
+    ANALYZE executes the query; returns None for anything but a select.
+    '''
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    with read_connection().cursor() as cursor:
+        cursor.execute(
+            'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {}'.format(sql), params)
+        plan = cursor.fetchone()[0]
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+
+def can_prepare_statements():
+    '''True if search statements are to be prepared on the server.
+
+    psycopg 3 prepares only with server-side binding; with client-side
+    binding, django's default, params are merged into the sql text.
+    '''
+    connection = read_connection()
+    return (
+        CATCH_SEARCH_PREPARE_THRESHOLD is not None
+        and is_psycopg3
+        and connection.vendor == 'postgresql'
+        and connection.settings_dict['OPTIONS'].get(
+            'server_side_binding') is True)
+
+
+@contextmanager
+def prepared_statements():
+    '''statements run in the block are prepared on the server, if enabled.
+
+    a statement is prepared once it ran CATCH_SEARCH_PREPARE_THRESHOLD times
+    in the connection, then later runs skip parse and, mostly, plan. psycopg
+    keeps track of prepared statements per connection, so these live as long
+    as a persistent connection (CONN_MAX_AGE) and are dropped with it; it
+    also discards them on rollback or ddl. Statements run outside the block
+    are not prepared.
+    '''
+    if not can_prepare_statements():
+        yield
+        return
+
+    connection = read_connection()
+    connection.ensure_connection()
+    pg_connection = connection.connection
+    pg_connection.prepare_threshold = CATCH_SEARCH_PREPARE_THRESHOLD
+    try:
+        yield
+    finally:
+        # might have been closed in the block, on error
+        if not pg_connection.closed:
+            pg_connection.prepare_threshold = None
+
+
+def prepared_statement_stats():
+    '''runs of each statement prepared in this connection.
+
+    `generic_plans` are runs that reused the cached plan, `custom_plans`
+    runs that were planned again for their params.
+    '''
+    with read_connection().cursor() as cursor:
+        cursor.execute(
+            'SELECT statement, prepare_time, generic_plans, custom_plans '
+            'FROM pg_prepared_statements WHERE NOT from_sql '
+            'ORDER BY generic_plans + custom_plans DESC')
+        rows = cursor.fetchall()
+    statements = [
+        {
+            'sql': sql,
+            'prepared': prepare_time.isoformat(),
+            'generic_plans': generic_plans,
+            'custom_plans': custom_plans,
+        }
+        for (sql, prepare_time, generic_plans, custom_plans) in rows
+    ]
+    return {
+        'statements': statements,
+        'total_generic_plans': sum(s['generic_plans'] for s in statements),
+        'total_custom_plans': sum(s['custom_plans'] for s in statements),
+    }
+
+
+def _search_version_key(context_id=None, collection_id=None):
+    '''cache key for the version of searches in context/collection.'''
+    if context_id and collection_id:
+        scope = ['collection', context_id, collection_id]
+    elif context_id:
+        scope = ['context', context_id]
+    else:
+        scope = ['global']
+    return 'catchpy:search:version:{}'.format(
+        hashlib.sha1(json.dumps(scope).encode('utf-8')).hexdigest())
+
+
+def search_cache_version(context_id=None, collection_id=None):
+    '''current version for searches in context/collection.
+
+    searches with both context_id and collection_id follow the collection
+    version; with context_id only, the context version; others follow the
+    global version.
+    '''
+    cache = caches[CATCH_SEARCH_CACHE_ALIAS]
+    key = _search_version_key(context_id, collection_id)
+    version = cache.get(key)
+    if version is None:
+        # a random version, so evicted versions don't revive old entries
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_search_cache_version(context_id=None, collection_id=None):
+    '''invalidates cached searches that might include context/collection.'''
+    keys = [_search_version_key()]
+    if context_id:
+        keys.append(_search_version_key(context_id))
+        if collection_id:
+            keys.append(_search_version_key(context_id, collection_id))
+    caches[CATCH_SEARCH_CACHE_ALIAS].set_many(
+        {key: uuid.uuid4().hex for key in keys}, None)
+
 
+def search_cache_key(params, read_scope, context_id=None, collection_id=None):
+    '''cache key for a search response.
 
+    params is a list of (name, [values]) from the querystring; read_scope
+    is who can read the results, since results depend on permissions.
+    '''
+    normalized = json.dumps([sorted(params), read_scope])
+    return 'catchpy:search:{}:{}'.format(
+        search_cache_version(context_id, collection_id),
+        hashlib.sha1(normalized.encode('utf-8')).hexdigest())
@@ -1,6 +1,7 @@
 from datetime import datetime
 from datetime import timedelta
 from dateutil import tz
+from copy import deepcopy
 import json
 import pytest
 
@@ -209,12 +210,66 @@ def test_update_anno_ok(wa_text):
     assert original_created.utcoffset() is not None
 
     assert(x.anno_tags.count() == original_tags+1)
+    assert sorted(x.tags) == sorted(t.tag_name for t in x.anno_tags.all())
+    assert 'tag2017' in Anno._default_manager.get(pk=x.anno_id).tags
     assert(x.target_set.count() == original_targets+1)
     assert(x.body_text == original_body_text)
     assert(x.created == original_created)
     assert(x.modified > original_created)
 
 
+@pytest.mark.django_db
+def test_target_ranges():
+    wa = make_wa_object(age_in_hours=1, media='Video')
+    wa['target']['items'][0]['selector']['items'][0]['value'] = 't=10.5,20'
+    x = CRUD.create_anno(wa)
+    t = x.target_set.get()
+    assert t.text_range is None
+    assert (t.time_range.lower, t.time_range.upper) == (10.5, 20)
+
+    # spans all selections; updates recreate targets
+    wa = make_wa_object(age_in_hours=1, media='Text')
+    selectors = wa['target']['items'][0]['selector']['items']
+    selectors.insert(1, deepcopy(selectors[0]))
+    selectors[0]['refinedBy'][0].update({'start': 300, 'end': 400})
+    selectors[1]['refinedBy'][0].update({'start': '50', 'end': '60'})
+    x = CRUD.create_anno(wa)
+    t = x.target_set.get()
+    assert t.time_range is None
+    assert t.text_range.lower == 50 and 400 in t.text_range
+
+    selectors.pop(0)
+    x = CRUD.update_anno(x, wa)
+    t = x.target_set.get()
+    assert 60 in t.text_range and 61 not in t.text_range
+
+
+@pytest.mark.django_db
+def test_target_region():
+    wa = make_wa_object(age_in_hours=1, media='Image')
+    selectors = wa['target']['items'][0]['selector']['items']
+    selectors[0]['value'] = 'xywh=10,20,30,40'
+    # dual strategy, as from mirador
+    selectors.append({
+        '@type': 'oa:SpecificResource',
+        'selector': {
+            '@type': 'oa:Choice',
+            'default': {
+                '@type': 'oa:FragmentSelector',
+                'value': 'xywh=pixel:100,100,50.5,50'},
+            'item': {'@type': 'oa:SvgSelector', 'value': '<svg></svg>'},
+        },
+    })
+    x = CRUD.create_anno(wa)
+    assert x.target_set.get(target_media='Image').region == (
+        10, 20, 150.5, 150)
+    assert x.target_set.get(target_media='Thumbnail').region is None
+
+    selectors.pop()
+    x = CRUD.update_anno(x, wa)
+    assert x.target_set.get(target_media='Image').region == (10, 20, 40, 60)
+
+
 @pytest.mark.usefixtures('wa_text')
 @pytest.mark.django_db
 def test_update_anno_delete_tags_ok(wa_text):
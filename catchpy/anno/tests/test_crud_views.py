@@ -1,11 +1,17 @@
 import json
 
 import pytest
+from asgiref.sync import async_to_sync
 from catchpy.anno.anno_defaults import ANNO, TEXT
 from catchpy.anno.crud import CRUD
 from catchpy.anno.json_models import AnnoJS, Catcha
 from catchpy.anno.models import Anno
-from catchpy.anno.views import _format_response, crud_api, crud_compat_api
+from catchpy.anno.views import (
+    _format_response,
+    async_crud_api,
+    crud_api,
+    crud_compat_api,
+)
 from catchpy.consumer.models import Consumer
 from django.conf import settings
 from django.test import Client
@@ -58,6 +64,77 @@ def test_head_ok(wa_audio):
     assert len(response.content) == 0
 
 
+@pytest.mark.usefixtures("wa_audio")
+@pytest.mark.django_db
+def test_read_etag(wa_audio):
+    x = CRUD.create_anno(wa_audio)
+    c = Consumer._default_manager.create()
+    payload = make_jwt_payload(apikey=c.consumer, user=x.creator_id)
+    token = make_encoded_token(c.secret_key, payload)
+    url = reverse("crud_api", kwargs={"anno_id": x.anno_id})
+
+    client = Client()
+    response = client.get(url, HTTP_AUTHORIZATION="token " + token)
+    assert response.status_code == 200
+    etag = response["ETag"]
+    assert etag.startswith('W/"')
+
+    response = client.get(
+        url, HTTP_AUTHORIZATION="token " + token, HTTP_IF_NONE_MATCH=etag
+    )
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+    assert len(response.content) == 0
+
+    # a new reply changes the replies count, then the etag
+    reply = make_wa_object(age_in_hours=1, reply_to=x.anno_id)
+    CRUD.create_anno(reply)
+    response = client.get(
+        url, HTTP_AUTHORIZATION="token " + token, HTTP_IF_NONE_MATCH=etag
+    )
+    assert response.status_code == 200
+    assert response.json()["totalReplies"] == 1
+    assert response["ETag"] != etag
+
+
+@pytest.mark.usefixtures("wa_text")
+@pytest.mark.django_db
+def test_async_crud(wa_text):
+    payload = make_jwt_payload()
+    wa_text["permissions"]["can_update"].append(payload["userId"])
+    x = CRUD.create_anno(wa_text)
+    CRUD.create_anno(make_wa_object(age_in_hours=1, reply_to=x.anno_id))
+
+    def crud(view, method="get", anno_id=x.anno_id, data=None, etag=None):
+        request = make_json_request(method=method, anno_id=anno_id, data=data)
+        request.catchjwt = payload
+        if etag is not None:
+            request.META["HTTP_IF_NONE_MATCH"] = etag
+        return view(request, anno_id)
+
+    async_crud = async_to_sync(async_crud_api)
+
+    # async read is the same as sync
+    response = crud(async_crud)
+    expected = crud(crud_api)
+    assert response.status_code == 200
+    assert json.loads(response.content) == json.loads(expected.content)
+    assert json.loads(response.content)["totalReplies"] == 1
+    assert response["ETag"] == expected["ETag"]
+    assert crud(async_crud, etag=response["ETag"]).status_code == 304
+
+    assert crud(async_crud, anno_id="1234567890-fake-fake").status_code == 404
+    assert crud(async_crud, method="patch").status_code == 405
+
+    # writes are delegated to sync
+    data = x.serialized
+    data["body"]["items"][0]["value"] = "changed in async"
+    response = crud(async_crud, method="put", data=json.dumps(data))
+    assert response.status_code == 200
+    assert x.anno_id in response["Location"]
+    assert Anno._default_manager.get(pk=x.anno_id).body_text == "changed in async"
+
+
 @pytest.mark.django_db
 def test_read_not_found():
     c = Consumer._default_manager.create()
@@ -48,4 +48,48 @@ def test_anno_object():
     assert(tag1.anno_set.all()[0].anno_id == anno.anno_id)
 
 
+@pytest.mark.django_db
+def test_anno_platform_columns_follow_raw():
+    anno = Anno(anno_id='123', raw={
+        'platform': {
+            'platform_name': 'hxat-edx',
+            'context_id': 'course-v1:x',
+            'collection_id': 42,
+            'target_source_id': 'src_1',
+        }})
+    anno.save()
+    anno = Anno.objects.get(pk='123')
+    assert anno.platform_name == 'hxat-edx'
+    assert anno.context_id == 'course-v1:x'
+    assert anno.collection_id == '42'
+    assert anno.target_source_id == 'src_1'
+
+    anno.raw['platform']['context_id'] = 'course-v1:y'
+    anno.save()
+    assert Anno.objects.filter(context_id='course-v1:y').count() == 1
+
+    anno.raw = 'baba'
+    anno.save()
+    assert Anno.objects.get(pk='123').context_id is None
+
+
+@pytest.mark.django_db
+def test_anno_is_public_follows_can_read():
+    anno = Anno(anno_id='123', raw={})
+    anno.save()
+    assert anno.is_public
+    assert anno.has_permission_for('read', 'anyone')
+
+    anno.can_read = ['someone']
+    anno.save()
+    anno = Anno.objects.get(pk='123')
+    assert not anno.is_public
+    assert anno.has_permission_for('read', 'someone')
+    assert not anno.has_permission_for('read', 'anyone')
+    assert anno.permissions_for_user('anyone') == []
 
+    # checks in python follow can_read, saved or not
+    anno.can_read = []
+    assert anno.has_permission_for('read', 'anyone')
+    assert Anno(anno_id='456', raw={}).permissions_for_user('anyone') == [
+        'can_read']
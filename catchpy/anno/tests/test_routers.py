@@ -0,0 +1,176 @@
+import json
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from catchpy.anno.crud import CRUD
+from catchpy.anno.models import Anno
+from catchpy.anno.routers import ReplicaRouter
+from catchpy.anno.routers import choose_replica
+from catchpy.anno.routers import replica_reads
+from catchpy.anno.search import prepared_statements
+from catchpy.anno.views import async_crud_api
+from catchpy.anno.views import async_search_api
+from catchpy.anno.views import crud_api
+from catchpy.anno.views import msearch_api
+from catchpy.anno.views import search_api
+
+from .conftest import make_json_request
+from .conftest import make_jwt_payload
+from .conftest import make_wa_object
+
+
+# `replica` reads the same test database as default, see settings/test.py
+replica_weights = patch.dict(
+    'catchpy.anno.routers.CATCH_DB_REPLICA_WEIGHTS', {'replica': 1})
+
+
+def queries_per_db(func, *args, **kwargs):
+    with CaptureQueriesContext(connections['default']) as default:
+        with CaptureQueriesContext(connections['replica']) as replica:
+            result = func(*args, **kwargs)
+    return (result, len(default.captured_queries),
+            len(replica.captured_queries))
+
+
+def test_router():
+    router = ReplicaRouter()
+    assert router.db_for_read(Anno) is None
+    with replica_weights:
+        with replica_reads():
+            assert router.db_for_read(Anno) == 'replica'
+            assert router.db_for_write(Anno) == 'default'
+            assert Anno._default_manager.all().db == 'replica'
+        assert router.db_for_read(Anno) is None
+    with replica_reads():  # no replicas
+        assert router.db_for_read(Anno) is None
+    assert router.allow_migrate('default', 'anno')
+    assert not router.allow_migrate('replica', 'anno')
+
+
+def test_choose_replica_by_weight():
+    weights = {'replica_0': 3, 'replica_1': 1, 'replica_2': 0}
+    with patch.dict(
+            'catchpy.anno.routers.CATCH_DB_REPLICA_WEIGHTS', weights):
+        picks = [choose_replica() for i in range(400)]
+    assert 'replica_2' not in picks
+    assert picks.count('replica_0') > picks.count('replica_1')
+    assert choose_replica() is None
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_reads_from_replica_unless_recent_writer():
+    caches['default'].clear()
+    writer = 'writer'
+    reader = 'reader'
+    anno = CRUD.create_anno(make_wa_object(age_in_hours=1, user=writer))
+
+    def request(method, user, query_string='', data=None):
+        request = make_json_request(
+            method=method, query_string=query_string, data=data,
+            jwt_payload=make_jwt_payload(user=user))
+        return request
+
+    with replica_weights:
+        response, on_default, on_replica = queries_per_db(
+            search_api, request('get', reader, 'limit=-1'))
+        assert response.status_code == 200
+        assert on_default == 0 and on_replica > 0
+
+        response, on_default, on_replica = queries_per_db(
+            crud_api, request('get', writer), anno.anno_id)
+        assert response.status_code == 200
+        assert on_default == 0 and on_replica > 0
+
+        # streamed rows are read after the view returns
+        response = search_api(request('get', reader, 'stream=true'))
+        content, on_default, on_replica = queries_per_db(
+            b''.join, response.streaming_content)
+        assert len(json.loads(content)['rows']) == 1
+        assert on_default == 0 and on_replica > 0
+
+        catcha = anno.serialized
+        catcha['body']['items'][0]['value'] = 'updated'
+        response, on_default, on_replica = queries_per_db(
+            crud_api, request('put', writer, data=catcha), anno.anno_id)
+        assert response.status_code == 200
+        assert on_default > 0 and on_replica == 0
+
+        # the writer reads its writes from default; others from the replica
+        response, on_default, on_replica = queries_per_db(
+            crud_api, request('get', writer), anno.anno_id)
+        assert response.status_code == 200
+        assert on_default > 0 and on_replica == 0
+        response, on_default, on_replica = queries_per_db(
+            search_api, request('get', reader))
+        assert on_default == 0 and on_replica > 0
+
+        # same for async views
+        response, on_default, on_replica = queries_per_db(
+            async_to_sync(async_crud_api), request('get', writer),
+            anno.anno_id)
+        assert response.status_code == 200
+        assert on_default > 0 and on_replica == 0
+        response, on_default, on_replica = queries_per_db(
+            async_to_sync(async_search_api), request('get', reader))
+        assert response.status_code == 200
+        assert on_default == 0 and on_replica > 0
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_export_reads_from_replica():
+    anno = CRUD.create_anno(make_wa_object(age_in_hours=1))
+    out = StringIO()
+    with replica_weights:
+        result, on_default, on_replica = queries_per_db(
+            call_command, 'export', context_id='fake_context', stdout=out)
+        assert on_default == 0 and on_replica > 0
+        assert [a['id'] for a in json.loads(out.getvalue())] == [anno.anno_id]
+
+        result, on_default, on_replica = queries_per_db(
+            call_command, 'export', context_id='fake_context',
+            from_primary=True, stdout=StringIO())
+        assert on_default > 0 and on_replica == 0
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_search_helpers_use_the_replica_connection():
+    caches['default'].clear()
+    CRUD.create_anno(make_wa_object(age_in_hours=1))
+    admin = make_jwt_payload(user=settings.CATCH_ADMIN_GROUP_ID)
+
+    with replica_weights:
+        # msearch is a POST, but only reads
+        request = make_json_request(
+            method='post', jwt_payload=admin,
+            data={'searches': [{'params': {'limit': 1}}]})
+        response, on_default, on_replica = queries_per_db(msearch_api, request)
+        assert response.status_code == 200
+        assert on_default == 0 and on_replica > 0
+
+        # profile captures and explains the queries where they ran
+        request = make_json_request(
+            method='get', query_string='profile=true', jwt_payload=admin)
+        response, on_default, on_replica = queries_per_db(search_api, request)
+        profile = json.loads(response.content)['profile']
+        assert profile['total_queries'] > 0
+        assert all(q['plan'] is not None for q in profile['queries'])
+        assert on_default == 0 and on_replica > 0
+
+        # statements are prepared in the replica connection
+        default_threshold = connections['default'].connection.prepare_threshold
+        with patch('catchpy.anno.search.can_prepare_statements',
+                   return_value=True), \
+                patch('catchpy.anno.search.CATCH_SEARCH_PREPARE_THRESHOLD', 1):
+            with replica_reads(), prepared_statements():
+                assert connections['replica'].connection.prepare_threshold == 1
+                assert connections['default'].connection.prepare_threshold == (
+                    default_threshold)
+        assert connections['replica'].connection.prepare_threshold is None
@@ -1,20 +1,34 @@
 from copy import deepcopy
 import json
 import pytest
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
 
 from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
 from django.db import IntegrityError
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from catchpy.anno.anno_defaults import ANNOTATORJS_FORMAT, CATCH_ANNO_FORMAT
 from catchpy.anno.anno_defaults import AUDIO, IMAGE, TEXT, VIDEO, THUMB, ANNO
 from catchpy.anno.crud import CRUD
+from catchpy.anno.json_models import AnnoJS
 from catchpy.anno.json_models import Catcha
 from catchpy.anno.models import Anno, Tag, Target
 from catchpy.anno.models import PURPOSE_TAGGING
-from catchpy.anno.json_models import Catcha
+from catchpy.anno.search import query_target_medias
+from catchpy.anno.search import query_userid
+from catchpy.anno.views import async_search_api
+from catchpy.anno.views import async_search_back_compat_api
+from catchpy.anno.views import changes_api
 from catchpy.anno.views import search_api
+from catchpy.anno.views import search_back_compat_api
+from catchpy.anno.views import suggest_api
+from catchpy.anno.views import thread_api
 from catchpy.consumer.models import Consumer
 
 from .conftest import make_annotatorjs_object
@@ -231,6 +245,22 @@ def test_search_by_tag_or_tag(wa_video):
             assert Catcha.has_tag(a, common_tag_value) is True
 
 
+@pytest.mark.django_db
+def test_search_by_tag_or_tag_no_duplicates():
+    wa = make_wa_object(age_in_hours=30)
+    wa['body']['items'] = wa['body']['items'][:1] + [
+        make_wa_tag('tag_a'), make_wa_tag('tag_b')]
+    anno = CRUD.create_anno(wa)
+
+    request = make_json_request(
+        method='get', query_string='tag=tag_a&tag=tag_b&tag=')
+    response = search_api(request)
+    resp = json.loads(response.content.decode('utf-8'))
+    assert response.status_code == 200
+    assert resp['total'] == 1
+    assert [a['id'] for a in resp['rows']] == [anno.anno_id]
+
+
 @pytest.mark.usefixtures('wa_audio', 'wa_image')
 @pytest.mark.django_db
 def test_search_by_target_source_ok(wa_audio, wa_image):
@@ -726,3 +756,1065 @@ def test_search_replies_js_with_uri(js_list):
         assert annojs['parent'] == reply_to.anno_id
         assert annojs['user']['id'] == payload['userId']
 
+
+@pytest.mark.usefixtures('wa_list')
+@pytest.mark.django_db
+def test_search_by_cursor_ok(wa_list):
+    for wa in wa_list:
+        CRUD.create_anno(wa)
+
+    payload = make_jwt_payload()
+    expected = [a.anno_id for a in
+                Anno._default_manager.all().order_by('-created', '-anno_id')]
+
+    found = []
+    cursor = ''
+    while cursor is not None:
+        request = make_json_request(
+            method='get', query_string='limit=3&cursor={}'.format(cursor))
+        request.catchjwt = payload
+
+        response = search_api(request)
+        resp = json.loads(response.content.decode('utf-8'))
+        assert response.status_code == 200
+        assert resp['total'] == len(wa_list)
+        assert resp['size'] <= 3
+        found.extend([a['id'] for a in resp['rows']])
+        cursor = resp['next_cursor']
+
+    assert found == expected
+
+
+@pytest.mark.usefixtures('js_list')
+@pytest.mark.django_db
+def test_search_back_compat_by_cursor_ok(js_list):
+    for js in js_list:
+        CRUD.create_anno(Catcha.normalize(js))
+
+    c = Consumer._default_manager.create()
+    payload = make_jwt_payload(apikey=c.consumer)
+    token = make_encoded_token(c.secret_key, payload)
+    client = Client()
+
+    url = '{}?limit=2&after='.format(reverse('compat_search'))
+    response = client.get(url, HTTP_X_ANNOTATOR_AUTH_TOKEN=token)
+    assert response.status_code == 200
+    first = response.json()
+    assert first['size'] == 2
+    assert first['next_cursor'] is not None
+
+    url = '{}?limit=2&after={}'.format(
+        reverse('compat_search'), first['next_cursor'])
+    response = client.get(url, HTTP_X_ANNOTATOR_AUTH_TOKEN=token)
+    assert response.status_code == 200
+    second = response.json()
+    first_ids = set([a['id'] for a in first['rows']])
+    for a in second['rows']:
+        assert a['id'] not in first_ids
+
+
+@pytest.mark.django_db
+def test_search_by_invalid_cursor():
+    request = make_json_request(
+        method='get', query_string='cursor=not-a-cursor')
+
+    response = search_api(request)
+    assert response.status_code == 400
+
+
+@pytest.mark.usefixtures('wa_list')
+@pytest.mark.django_db
+def test_search_count_modes(wa_list):
+    caches['default'].clear()
+    for wa in wa_list:
+        CRUD.create_anno(wa)
+    total = len(wa_list)
+
+    payload = make_jwt_payload()
+    resp = {}
+    for mode in ['exact', 'cached', 'estimated', 'none']:
+        request = make_json_request(
+            method='get', query_string='count={}&limit=2'.format(mode))
+        request.catchjwt = payload
+        response = search_api(request)
+        assert response.status_code == 200
+        resp[mode] = json.loads(response.content.decode('utf-8'))
+        assert resp[mode]['total_strategy'] == mode
+        assert resp[mode]['size'] == 2
+
+    assert resp['exact']['total'] == total
+    assert resp['cached']['total'] == total
+    assert isinstance(resp['estimated']['total'], int)
+    assert resp['none']['total'] is None
+
+    # cached count does not see the new anno until it expires
+    wa = deepcopy(wa_list[0])
+    wa['id'] = '{}-more'.format(wa['id'])
+    CRUD.create_anno(wa)
+    request = make_json_request(method='get', query_string='count=cached')
+    request.catchjwt = payload
+    response = search_api(request)
+    assert json.loads(response.content.decode('utf-8'))['total'] == total
+
+
+@pytest.mark.django_db
+def test_search_count_mode_per_consumer():
+    payload = make_jwt_payload(apikey='consumer_that_skips_count')
+    request = make_json_request(method='get', query_string='limit=1')
+    request.catchjwt = payload
+
+    with patch.dict(
+            'catchpy.anno.views.CATCH_SEARCH_COUNT_MODE_BY_CONSUMER',
+            {'consumer_that_skips_count': 'none'}):
+        response = search_api(request)
+    resp = json.loads(response.content.decode('utf-8'))
+    assert response.status_code == 200
+    assert resp['total'] is None
+    assert resp['total_strategy'] == 'none'
+
+    request = make_json_request(method='get', query_string='count=bogus')
+    response = search_api(request)
+    assert response.status_code == 400
+
+
+@pytest.mark.usefixtures('wa_list')
+@pytest.mark.django_db
+def test_search_window_count_and_count_only(wa_list):
+    for wa in wa_list:
+        CRUD.create_anno(wa)
+    total = len(wa_list)
+
+    def search(query_string, method='get', view=search_api):
+        request = make_json_request(method=method, query_string=query_string)
+        with CaptureQueriesContext(connection) as ctx:
+            response = view(request)
+        assert response.status_code == 200
+        return (response, len(ctx.captured_queries))
+
+    response, exact_queries = search('count=exact&limit=2&offset=1')
+    expected = json.loads(response.content.decode('utf-8'))
+    # page and total in the same query
+    response, queries = search('count=window&limit=2&offset=1')
+    resp = json.loads(response.content.decode('utf-8'))
+    assert queries == exact_queries - 1
+    assert resp['total'] == total
+    assert resp['total_strategy'] == 'window'
+    assert resp['rows'] == expected['rows']
+
+    # no row to read the total from
+    response, queries = search('count=window&offset={}'.format(total))
+    resp = json.loads(response.content.decode('utf-8'))
+    assert resp['size'] == 0
+    assert resp['total'] == total
+    # no page fetched, as in facet-only searches
+    response, queries = search('count=window&limit=0')
+    resp = json.loads(response.content.decode('utf-8'))
+    assert resp['size'] == 0
+    assert resp['total'] == total
+    response, queries = search('count=window&userid=nobody')
+    assert json.loads(response.content.decode('utf-8'))['total'] == 0
+    # cursor pages do not see the rows before the cursor
+    response, queries = search('count=window&limit=2&cursor=')
+    resp = json.loads(response.content.decode('utf-8'))
+    response, queries = search(
+        'count=window&limit=2&cursor={}'.format(resp['next_cursor']))
+    assert json.loads(response.content.decode('utf-8'))['total'] == total
+
+    # total only, no etag nor rows
+    for (query_string, method) in [
+            ('count_only=true&count=window', 'get'),
+            ('count=none', 'head')]:
+        response, queries = search(query_string, method=method)
+        assert queries == 1
+        assert response['X-Total-Count'] == str(total)
+        assert 'ETag' not in response
+        assert json.loads(response.content.decode('utf-8')) == {
+            'total': total, 'total_strategy': 'exact'}
+
+    response, queries = search(
+        'count_only=1&media=Text', view=search_back_compat_api)
+    resp = json.loads(response.content.decode('utf-8'))
+    assert queries == 1
+    assert resp['total'] == len(
+        [wa for wa in wa_list if wa['target']['items'][0]['type'] == TEXT])
+
+
+@pytest.mark.usefixtures('wa_list')
+@pytest.mark.django_db
+def test_search_queries_do_not_grow_with_page_size(wa_list):
+    anno_list = []
+    for wa in wa_list:
+        anno_list.append(CRUD.create_anno(wa))
+    for i in range(0, 3):
+        r = make_wa_object(
+            age_in_hours=1, media=ANNO, reply_to=anno_list[0].anno_id)
+        CRUD.create_anno(r)
+
+    payload = make_jwt_payload()
+    queries = []
+    for limit in [1, 3, -1]:
+        request = make_json_request(
+            method='get', query_string='limit={}'.format(limit))
+        request.catchjwt = payload
+        with CaptureQueriesContext(connection) as ctx:
+            response = search_api(request)
+        assert response.status_code == 200
+        queries.append(len(ctx.captured_queries))
+    assert queries[0] == queries[1] == queries[2]
+
+    resp = json.loads(response.content.decode('utf-8'))
+    for a in resp['rows']:
+        expected = 3 if a['id'] == anno_list[0].anno_id else 0
+        assert a['totalReplies'] == expected
+
+
+@pytest.mark.usefixtures('js_list')
+@pytest.mark.django_db
+def test_search_back_compat_queries_do_not_grow_with_page_size(js_list):
+    anno_list = []
+    for js in js_list:
+        anno_list.append(CRUD.create_anno(Catcha.normalize(js)))
+    reply_to = anno_list[0]
+    for i in range(0, 3):
+        js = make_annotatorjs_object(
+            age_in_hours=1, media=ANNO, reply_to=reply_to.anno_id)
+        CRUD.create_anno(Catcha.normalize(js))
+
+    payload = make_jwt_payload()
+    queries = []
+    for limit in [1, 4, -1]:
+        request = make_json_request(
+            method='get', query_string='limit={}'.format(limit))
+        request.catchjwt = payload
+        with CaptureQueriesContext(connection) as ctx:
+            response = search_back_compat_api(request)
+        assert response.status_code == 200
+        queries.append(len(ctx.captured_queries))
+    assert queries[0] == queries[1] == queries[2]
+
+    resp = json.loads(response.content.decode('utf-8'))
+    assert resp['size'] == len(anno_list) + 3
+    for annojs in resp['rows']:
+        if annojs['media'] == 'comment':
+            assert annojs['parent'] == reply_to.anno_id
+        elif str(annojs['id']) == reply_to.anno_id:
+            assert annojs['totalComments'] == 3
+            assert len(annojs['tags']) == len(reply_to.anno_tags.all())
+
+
+@pytest.mark.usefixtures('js_list')
+@pytest.mark.django_db
+def test_convert_anno_list_same_as_single(js_list):
+    for js in js_list:
+        CRUD.create_anno(Catcha.normalize(js))
+
+    annos = list(Anno._default_manager.all())
+    (rows, failed) = AnnoJS.convert_from_anno_list(annos)
+    assert failed == []
+    for anno, annojs in zip(annos, rows):
+        single = AnnoJS.convert_from_anno(
+            Anno._default_manager.get(pk=anno.anno_id))
+        # tags come in no particular order
+        assert sorted(annojs.pop('tags')) == sorted(single.pop('tags'))
+        assert annojs == single
+
+
+@pytest.mark.usefixtures('wa_list', 'js_list')
+@pytest.mark.django_db
+def test_search_stream_same_as_regular(wa_list, js_list):
+    for wa in wa_list:
+        CRUD.create_anno(wa)
+    for js in js_list:
+        CRUD.create_anno(Catcha.normalize(js))
+
+    c = Consumer._default_manager.create()
+    payload = make_jwt_payload(apikey=c.consumer)
+    token = make_encoded_token(c.secret_key, payload)
+    client = Client()
+
+    for url in [reverse('create_or_search'), reverse('compat_search')]:
+        response = client.get(
+            '{}?limit=-1'.format(url), HTTP_X_ANNOTATOR_AUTH_TOKEN=token)
+        assert response.status_code == 200
+        regular = response.json()
+
+        response = client.get(
+            '{}?limit=-1&stream=true'.format(url),
+            HTTP_X_ANNOTATOR_AUTH_TOKEN=token)
+        assert response.status_code == 200
+        assert response.streaming
+        streamed = json.loads(b''.join(response.streaming_content))
+
+        assert streamed['size'] == regular['size']
+        assert streamed['total'] == regular['total']
+        assert [a['id'] for a in streamed['rows']] == [
+            a['id'] for a in regular['rows']]
+        if url == reverse('compat_search'):
+            # catcha ids are not integers
+            assert streamed['size_failed'] == len(wa_list)
+
+
+@pytest.mark.django_db
+def test_search_by_text_uses_html_stripped_body_and_tags():
+    wa = make_wa_object(
+        age_in_hours=30,
+        body_value='<p class="marginalia">the tempest was brewing</p>')
+    wa['body']['items'].append(make_wa_tag('shipwreck'))
+    anno = CRUD.create_anno(wa)
+    CRUD.create_anno(make_wa_object(age_in_hours=20, body_value='calm'))
+
+    payload = make_jwt_payload()
+    for (text, expected) in [
+            ('tempest', 1), ('shipwreck', 1), ('marginalia', 0)]:
+        request = make_json_request(
+            method='get', query_string='text={}'.format(text))
+        request.catchjwt = payload
+        response = search_api(request)
+        resp = json.loads(response.content.decode('utf-8'))
+        assert response.status_code == 200
+        assert resp['total'] == expected
+        if expected:
+            assert resp['rows'][0]['id'] == anno.anno_id
+
+    # search vector follows updates
+    catcha = anno.serialized
+    catcha['body']['items'][0]['value'] = 'a quiet harbour'
+    CRUD.update_anno(anno, catcha)
+    for (text, expected) in [('tempest', 0), ('harbour', 1)]:
+        request = make_json_request(
+            method='get', query_string='text={}'.format(text))
+        request.catchjwt = payload
+        resp = json.loads(search_api(request).content.decode('utf-8'))
+        assert resp['total'] == expected
+
+
+@pytest.mark.django_db
+def test_search_by_text_relevance_and_highlight():
+    weak = CRUD.create_anno(make_wa_object(
+        age_in_hours=10, body_value='a storm far away'))
+    strong = CRUD.create_anno(make_wa_object(
+        age_in_hours=40, body_value='storm after storm, the storm'))
+    other = CRUD.create_anno(make_wa_object(
+        age_in_hours=5, body_value='sunny day'))
+
+    request = make_json_request(
+        method='get', query_string='text=storm&sort=relevance&highlight=true')
+    response = search_api(request)
+    resp = json.loads(response.content.decode('utf-8'))
+    assert response.status_code == 200
+    assert resp['total'] == 2
+    assert [r['id'] for r in resp['rows']] == [strong.anno_id, weak.anno_id]
+    assert other.anno_id not in [r['id'] for r in resp['rows']]
+    assert '<b>storm</b>' in resp['rows'][0]['headline']
+
+    # no headline unless asked
+    request = make_json_request(method='get', query_string='text=storm')
+    resp = json.loads(search_api(request).content.decode('utf-8'))
+    assert resp['total'] == 2
+    assert 'headline' not in resp['rows'][0]
+
+    for query_string in ['sort=relevance', 'text=storm&sort=relevance&cursor=']:
+        request = make_json_request(method='get', query_string=query_string)
+        response = search_api(request)
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_search_by_text_config_per_platform():
+    platform_name = 'hxat-simple'
+    with patch(
+            'catchpy.anno.search.CATCH_TEXT_SEARCH_CONFIG_BY_PLATFORM',
+            {platform_name: 'simple'}):
+        wa = make_wa_object(age_in_hours=30, body_value='running late')
+        wa['platform']['platform_name'] = platform_name
+        CRUD.create_anno(wa)
+
+        # simple config does not stem words
+        request = make_json_request(
+            method='get',
+            query_string='text=run&platform={}'.format(platform_name))
+        resp = json.loads(search_api(request).content.decode('utf-8'))
+        assert resp['total'] == 0
+
+        request = make_json_request(
+            method='get',
+            query_string='text=running&platform={}'.format(platform_name))
+        resp = json.loads(search_api(request).content.decode('utf-8'))
+        assert resp['total'] == 1
+
+
+@pytest.mark.django_db
+def test_search_cache_invalidated_by_writes(django_capture_on_commit_callbacks):
+    caches['default'].clear()
+    owner = 'owner_of_private'
+    query_string = 'context_id=fake_context&collection_id=fake_collection'
+
+    def search(user):
+        request = make_json_request(method='get', query_string=query_string)
+        request.catchjwt = make_jwt_payload(user=user)
+        response = search_api(request)
+        assert response.status_code == 200
+        return json.loads(response.content.decode('utf-8'))
+
+    with patch('catchpy.anno.views.CATCH_SEARCH_CACHE_TTL', 60):
+        with django_capture_on_commit_callbacks(execute=True):
+            CRUD.create_anno(make_wa_object(age_in_hours=30))
+            wa = make_wa_object(age_in_hours=20, user=owner)
+            wa['permissions']['can_read'] = [owner]
+            private = CRUD.create_anno(wa)
+
+        assert search('someone')['total'] == 1
+        assert search(owner)['total'] == 2
+        with CaptureQueriesContext(connection) as ctx:
+            assert search('someone')['total'] == 1
+        assert len(ctx.captured_queries) == 0
+
+        # write in another collection keeps the cached response
+        with django_capture_on_commit_callbacks(execute=True):
+            wa = make_wa_object(age_in_hours=10)
+            wa['platform']['collection_id'] = 'other_collection'
+            CRUD.create_anno(wa)
+        with CaptureQueriesContext(connection) as ctx:
+            assert search('someone')['total'] == 1
+        assert len(ctx.captured_queries) == 0
+
+        # create, update, delete in the collection invalidate it
+        with django_capture_on_commit_callbacks(execute=True):
+            CRUD.create_anno(make_wa_object(age_in_hours=5))
+        assert search('someone')['total'] == 2
+
+        with django_capture_on_commit_callbacks(execute=True):
+            catcha = private.serialized
+            catcha['permissions']['can_read'] = []
+            CRUD.update_anno(private, catcha)
+        assert search('someone')['total'] == 3
+
+        with django_capture_on_commit_callbacks(execute=True):
+            CRUD.delete_anno(private)
+        assert search('someone')['total'] == 2
+        assert search(owner)['total'] == 2
+
+
+@pytest.mark.django_db
+def test_search_facets():
+    for (user, tags, media) in [
+            ('ann', ['sea', 'sky'], TEXT),
+            ('ann', ['sea'], VIDEO),
+            ('bob', ['sea', 'sand'], TEXT),
+            ('bob', [], IMAGE)]:
+        wa = make_wa_object(age_in_hours=30, user=user, media=media)
+        wa['body']['items'] = wa['body']['items'][:1] + [
+            make_wa_tag(t) for t in tags]
+        CRUD.create_anno(wa)
+    # private to someone else, not counted
+    wa = make_wa_object(age_in_hours=30, user='carl')
+    wa['permissions']['can_read'] = ['carl']
+    CRUD.create_anno(wa)
+
+    request = make_json_request(
+        method='get', query_string='facets=tag,userid,media&limit=0')
+    with CaptureQueriesContext(connection) as ctx:
+        response = search_api(request)
+    resp = json.loads(response.content.decode('utf-8'))
+    assert response.status_code == 200
+    assert resp['size'] == 0
+    assert resp['facets']['tag'] == [
+        {'value': 'sea', 'count': 3},
+        {'value': 'sand', 'count': 1},
+        {'value': 'sky', 'count': 1}]
+    assert resp['facets']['userid'] == [
+        {'value': 'ann', 'count': 2}, {'value': 'bob', 'count': 2}]
+    assert resp['facets']['media'] == [
+        {'value': TEXT, 'count': 2},
+        {'value': IMAGE, 'count': 1},
+        {'value': THUMB, 'count': 1},
+        {'value': VIDEO, 'count': 1}]
+    # count, and one per facet; empty page is not queried
+    assert len(ctx.captured_queries) == 4
+
+    # facets follow the search filters, but tag filter does not hide tags
+    request = make_json_request(
+        method='get', query_string='tag=sky&facets=tag&facets=userid')
+    resp = json.loads(search_api(request).content.decode('utf-8'))
+    assert resp['total'] == 1
+    assert resp['facets']['tag'] == [
+        {'value': 'sea', 'count': 1}, {'value': 'sky', 'count': 1}]
+
+    request = make_json_request(method='get', query_string='facets=color')
+    assert search_api(request).status_code == 400
+
+
+def test_search_filters_same_sql_for_any_number_of_values():
+    query = Anno._default_manager.all()
+    (sql_one, params_one) = query.filter(
+        query_userid(['u1'])).query.sql_with_params()
+    (sql_many, params_many) = query.filter(
+        query_userid(['u{}'.format(i) for i in range(50)] + ['u1', ''])
+    ).query.sql_with_params()
+    assert sql_one == sql_many
+    assert params_one == (['u1'],)
+    assert len(params_many[0]) == 50
+
+    (sql_media, params_media) = query.filter(
+        query_target_medias([TEXT, VIDEO, TEXT])).query.sql_with_params()
+    assert 'ANY' in sql_media
+    assert params_media == ([TEXT, VIDEO],)
+
+    # nothing to filter
+    assert not query_userid(['', None])
+
+
+@pytest.mark.usefixtures('wa_list')
+@pytest.mark.django_db
+def test_search_profile(wa_list):
+    for wa in wa_list:
+        CRUD.create_anno(wa)
+
+    # not for regular users
+    request = make_json_request(method='get', query_string='profile=true')
+    response = search_api(request)
+    assert response.status_code == 403
+
+    for payload in [
+            make_jwt_payload(user=settings.CATCH_ADMIN_GROUP_ID),
+            make_jwt_payload(override=['CAN_PROFILE'])]:
+        request = make_json_request(
+            method='get', query_string='profile=true&limit=3&text=fortune')
+        request.catchjwt = payload
+        response = search_api(request)
+        resp = json.loads(response.content.decode('utf-8'))
+        assert response.status_code == 200
+        profile = resp['profile']
+        assert set(profile['timings']) == {
+            'prep', 'count', 'fetch', 'format', 'total'}
+        # count and page
+        assert profile['total_queries'] == 2
+        assert profile['queries'][0]['sql'].startswith('SELECT COUNT(*)')
+        for q in profile['queries']:
+            assert 'Plan' in q['plan'][0]
+            assert 'Execution Time' in q['plan'][0]
+
+    request = make_json_request(
+        method='get', query_string='profile=true&stream=true')
+    request.catchjwt = make_jwt_payload(user=settings.CATCH_ADMIN_GROUP_ID)
+    assert search_api(request).status_code == 400
+
+
+@pytest.mark.usefixtures('wa_list', 'js_list')
+@pytest.mark.django_db
+def test_msearch(wa_list, js_list):
+    for wa in wa_list:
+        CRUD.create_anno(wa)
+    for js in js_list:
+        CRUD.create_anno(Catcha.normalize(js))
+    parent_id = str(js_list[0]['id'])
+
+    c = Consumer._default_manager.create()
+    payload = make_jwt_payload(apikey=c.consumer)
+    token = make_encoded_token(c.secret_key, payload)
+    client = Client()
+
+    searches = [
+        {'params': {'media': 'Video', 'limit': 3}},
+        {'params': {'parentid': parent_id, 'limit': -1}, 'back_compat': True},
+        {'params': {'media': 'Video', 'limit': 3}},
+        {'params': {'count': 'bogus'}},
+        {'params': {'media': 'Video', 'count_only': 'true'}},
+    ]
+    response = client.post(
+        reverse('msearch_api'), data=json.dumps({'searches': searches}),
+        content_type='application/json', HTTP_X_ANNOTATOR_AUTH_TOKEN=token)
+    assert response.status_code == 200
+    responses = response.json()['responses']
+    assert len(responses) == 5
+
+    for i, search in enumerate(searches[:3]):
+        url = reverse(
+            'compat_search' if search.get('back_compat') else 'create_or_search')
+        single = client.get(
+            url, search['params'], HTTP_X_ANNOTATOR_AUTH_TOKEN=token).json()
+        assert responses[i]['total'] == single['total']
+        assert [a['id'] for a in responses[i]['rows']] == [
+            a['id'] for a in single['rows']]
+    assert responses[3]['status'] == 400
+    # count_only honored per item: the total, no rows
+    assert 'rows' not in responses[4]
+    assert responses[4]['total'] == client.get(
+        reverse('create_or_search'), {'media': 'Video'},
+        HTTP_X_ANNOTATOR_AUTH_TOKEN=token).json()['total']
+
+    response = client.post(
+        reverse('msearch_api'), data=json.dumps({'params': {}}),
+        content_type='application/json', HTTP_X_ANNOTATOR_AUTH_TOKEN=token)
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_thread(django_assert_max_num_queries):
+    payload = make_jwt_payload()
+    parent = CRUD.create_anno(make_wa_object(age_in_hours=1))
+    replies = [
+        CRUD.create_anno(
+            make_wa_object(age_in_hours=1, reply_to=parent.anno_id))
+        for i in range(3)]
+    nested = CRUD.create_anno(
+        make_wa_object(age_in_hours=1, reply_to=replies[0].anno_id))
+    deeper = CRUD.create_anno(
+        make_wa_object(age_in_hours=1, reply_to=nested.anno_id))
+    # private reply, only its creator can read it
+    wa = make_wa_object(age_in_hours=1, reply_to=replies[1].anno_id)
+    wa['permissions']['can_read'] = [wa['creator']['id']]
+    private = CRUD.create_anno(wa)
+    # public reply to the private one, hidden along with its parent
+    hidden = CRUD.create_anno(
+        make_wa_object(age_in_hours=1, reply_to=private.anno_id))
+    # unrelated anno, not in the thread
+    other = CRUD.create_anno(make_wa_object(age_in_hours=1))
+    CRUD.create_anno(make_wa_object(age_in_hours=1, reply_to=other.anno_id))
+
+    def get_thread(query_string='', max_queries=3):
+        request = make_json_request(method='get', query_string=query_string)
+        request.catchjwt = payload
+        # no query per level of replies
+        with django_assert_max_num_queries(max_queries):
+            response = thread_api(request, parent.anno_id)
+        return response.status_code, json.loads(response.content.decode())
+
+    status, resp = get_thread()
+    assert status == 200
+    assert resp['truncated'] is False
+    assert set(a['id'] for a in resp['rows']) == set(
+        a.anno_id for a in [parent, *replies, nested, deeper])
+    assert resp['size'] == 6
+
+    status, resp = get_thread('depth=1')
+    assert set(a['id'] for a in resp['rows']) == set(
+        a.anno_id for a in [parent, *replies])
+
+    status, resp = get_thread('limit=2')
+    assert len(resp['rows']) == 2
+    assert resp['truncated'] is True
+
+    # annotatorjs prefetches targets, tags and replies for the whole page
+    status, resp = get_thread('format=annotatorjs', max_queries=6)
+    assert status == 200
+    # these ids are not numeric, so they fail to convert
+    assert resp['size'] + resp['size_failed'] == 6
+
+    # the private reply shows up for its creator, with its replies
+    payload = make_jwt_payload(user=wa['creator']['id'])
+    status, resp = get_thread()
+    assert set(a['id'] for a in resp['rows']) == set(
+        a.anno_id for a in [parent, *replies, nested, deeper, private, hidden])
+
+    status, resp = get_thread('depth=x')
+    assert status == 400
+
+    # deleting the parent takes the whole thread with it
+    CRUD.delete_anno(parent)
+    assert Anno._default_manager.filter(
+        anno_id__in=[
+            r.anno_id for r in [*replies, nested, deeper, private, hidden]],
+        anno_deleted=False).count() == 0
+
+
+@pytest.mark.django_db
+def test_search_etag():
+    for i in range(3):
+        x = CRUD.create_anno(make_wa_object(age_in_hours=30))
+    query_string = 'context_id=fake_context&media=Text&limit=2'
+
+    def search(etag=None, user='reader'):
+        request = make_json_request(method='get', query_string=query_string)
+        request.catchjwt = make_jwt_payload(user=user)
+        if etag is not None:
+            request.META['HTTP_IF_NONE_MATCH'] = etag
+        return search_api(request)
+
+    # the etag aggregate is the count too: aggregate and page
+    with CaptureQueriesContext(connection) as ctx:
+        response = search()
+    assert response.status_code == 200
+    assert len(ctx.captured_queries) == 2
+    etag = response['ETag']
+
+    # 304 from the aggregate alone, the page is not fetched
+    with CaptureQueriesContext(connection) as ctx:
+        response = search(etag=etag)
+    assert len(ctx.captured_queries) == 1
+    assert response.status_code == 304
+    assert response['ETag'] == etag
+    assert search(etag='W/"other", {}'.format(etag)).status_code == 304
+
+    # another user, other params, or a write change the etag
+    assert search(etag=etag, user='someone_else').status_code == 200
+    query_string = 'context_id=fake_context&media=Text&limit=3'
+    assert search(etag=etag).status_code == 200
+    query_string = 'context_id=fake_context&media=Text&limit=2'
+
+    catcha = x.serialized
+    catcha['body']['items'][0]['value'] = 'updated'
+    CRUD.update_anno(x, catcha)
+    response = search(etag=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    etag = response['ETag']
+
+    # a reply, not a match itself, changes `totalReplies` in the page
+    reply = CRUD.create_anno(
+        make_wa_object(age_in_hours=1, reply_to=x.anno_id))
+    response = search(etag=etag)
+    assert response.status_code == 200
+    rows = json.loads(response.content.decode('utf-8'))['rows']
+    assert [a['totalReplies'] for a in rows if a['id'] == x.anno_id] == [1]
+    etag = response['ETag']
+    CRUD.delete_anno(reply)
+    assert search(etag=etag).status_code == 200
+    etag = search()['ETag']
+
+    CRUD.delete_anno(x)
+    assert search(etag=etag).status_code == 200
+
+    # other count modes skip the aggregate, unless asked with an etag
+    query_string = 'context_id=fake_context&media=Text&limit=2&count=window'
+    with CaptureQueriesContext(connection) as ctx:
+        response = search()
+    assert len(ctx.captured_queries) == 1
+    assert 'ETag' not in response
+    etag = search(etag='W/"other"')['ETag']
+    assert search(etag=etag).status_code == 304
+
+
+@pytest.mark.django_db
+def test_search_by_range():
+    def video(start, end):
+        wa = make_wa_object(age_in_hours=1, media=VIDEO)
+        wa['target']['items'][0]['selector']['items'][0]['value'] = (
+            't={},{}'.format(start, end))
+        return CRUD.create_anno(wa).anno_id
+
+    def text(start, end):
+        wa = make_wa_object(age_in_hours=1, media=TEXT)
+        wa['target']['items'][0]['selector']['items'][0]['refinedBy'][0].update(
+            {'start': start, 'end': end})
+        return CRUD.create_anno(wa).anno_id
+
+    v1 = video(0, 30)
+    v2 = video(25.5, 60)
+    v3 = video(120, 180)
+    t1 = text(10, 50)
+    t2 = text(500, 700)
+    CRUD.create_anno(make_wa_object(age_in_hours=1, media=IMAGE))
+
+    def search(query_string):
+        request = make_json_request(method='get', query_string=query_string)
+        response = search_api(request)
+        resp = json.loads(response.content.decode('utf-8'))
+        if response.status_code != 200:
+            return response.status_code
+        return sorted(a['id'] for a in resp['rows'])
+
+    assert search('media=video&range_start=20&range_end=26') == sorted([v1, v2])
+    assert search('media=video&range_start=60&range_end=100') == [v2]
+    assert search('media=video&range_start=100') == [v3]
+    assert search('media=video&range_end=0') == [v1]
+    assert search('media=text&range_start=45.5&range_end=499') == [t1]
+    assert search('media=text&range_start=700') == [t2]
+    assert search('range_start=0&range_end=10&limit=-1') == sorted([v1, t1])
+
+    assert search('range_start=ten') == 400
+    assert search('range_start=20&range_end=10') == 400
+
+
+@pytest.mark.django_db
+def test_search_by_bbox():
+    def image(xywh):
+        wa = make_wa_object(age_in_hours=1, media=IMAGE)
+        wa['target']['items'][0]['selector']['items'][0]['value'] = (
+            'xywh={}'.format(xywh))
+        return CRUD.create_anno(wa).anno_id
+
+    i1 = image('0,0,100,100')
+    i2 = image('90,90,20,20')
+    i3 = image('5000,5000,10,10')
+    CRUD.create_anno(make_wa_object(age_in_hours=1, media=VIDEO))
+
+    def search(query_string):
+        request = make_json_request(method='get', query_string=query_string)
+        response = search_api(request)
+        if response.status_code != 200:
+            return response.status_code
+        resp = json.loads(response.content.decode('utf-8'))
+        return sorted(a['id'] for a in resp['rows'])
+
+    assert search('bbox=50,50,10,10') == [i1]
+    assert search('bbox=95,95,1000,1000') == sorted([i1, i2])
+    assert search('bbox=0,0,10000,10000') == sorted([i1, i2, i3])
+    assert search('bbox=200.5,0,100,100') == []
+    # touching edges overlap
+    assert search('bbox=110,110,5,5') == [i2]
+
+    assert search('bbox=1,2,3') == 400
+    assert search('bbox=1,2,-3,4') == 400
+    assert search('bbox=a,b,c,d') == 400
+
+
+@pytest.mark.django_db
+def test_search_by_dates():
+    annos = []
+    for day in (1, 2, 3):
+        x = CRUD.create_anno(make_wa_object(age_in_hours=1))
+        Anno._default_manager.filter(pk=x.anno_id).update(
+            created='2024-01-0{}T12:00:00Z'.format(day),
+            modified='2024-02-0{}T12:00:00Z'.format(day))
+        annos.append(x.anno_id)
+
+    def search(query_string, view=search_api):
+        request = make_json_request(method='get', query_string=query_string)
+        response = view(request)
+        if response.status_code != 200:
+            return response.status_code
+        resp = json.loads(response.content.decode('utf-8'))
+        return sorted(a['id'] for a in resp['rows'])
+
+    assert search('created_after=2024-01-02T12:00:00Z') == sorted(annos[1:])
+    # before is exclusive, so consecutive windows do not overlap
+    assert search('created_before=2024-01-02T12:00:00Z') == annos[:1]
+    assert search(
+        'created_after=2024-01-02&created_before=2024-01-03') == annos[1:2]
+    # no timezone is utc
+    assert search('created_after=2024-01-03T11:59:59') == annos[2:]
+    assert search(
+        'created_after=2024-01-03T07:00:00-05:00') == annos[2:]
+    assert search('modified_after=2024-02-02&modified_before=2024-02-03&'
+                  'created_after=2024-01-01') == annos[1:2]
+    assert search('modified_before=2024-01-01') == []
+
+    # back-compat search takes them too
+    request = make_json_request(
+        method='get', query_string='created_after=2024-01-03&limit=10')
+    response = search_back_compat_api(request)
+    resp = json.loads(response.content.decode('utf-8'))
+    assert resp['total'] == 1
+
+    assert search('created_after=last+week') == 400
+    assert search('modified_before=2024-13-01') == 400
+
+
+@pytest.mark.usefixtures('wa_list')
+@pytest.mark.django_db
+def test_async_search(wa_list):
+    for wa in wa_list:
+        CRUD.create_anno(wa)
+    payload = make_jwt_payload()
+
+    def search(view, query_string, etag=None):
+        request = make_json_request(method='get', query_string=query_string)
+        request.catchjwt = payload
+        if etag is not None:
+            request.META['HTTP_IF_NONE_MATCH'] = etag
+        return view(request)
+
+    # async views respond the same as sync
+    views = [
+        (async_to_sync(async_search_api), search_api),
+        (async_to_sync(async_search_back_compat_api), search_back_compat_api),
+    ]
+    for (async_view, sync_view) in views:
+        for query_string in [
+                'limit=3&offset=1', 'limit=3&cursor=', 'facets=tag&count=cached',
+                'stream=true', 'limit=3&offset=1&count=window',
+                'count_only=true']:
+            response = search(async_view, query_string)
+            expected = search(sync_view, query_string)
+            assert response.status_code == 200
+            assert response.get('ETag') == expected.get('ETag')
+            if response.streaming:  # stream falls back to sync view
+                assert b''.join(response.streaming_content) == b''.join(
+                    expected.streaming_content)
+            else:
+                assert response.content == expected.content
+
+    response = search(async_view, 'limit=2')
+    assert json.loads(response.content)['total'] == len(wa_list)
+
+    response = search(views[0][0], 'limit=2')
+    etag = response['ETag']
+    assert search(views[0][0], 'limit=2', etag=etag).status_code == 304
+    assert search(views[0][0], 'cursor=not-a-cursor').status_code == 400
+
+
+@pytest.mark.django_db
+def test_changes_feed():
+    def changes(query_string, user='reader'):
+        request = make_json_request(method='get', query_string=query_string)
+        request.catchjwt = make_jwt_payload(user=user)
+        response = changes_api(request)
+        return response.status_code, json.loads(response.content.decode())
+
+    annos = [CRUD.create_anno(make_wa_object(age_in_hours=1)) for i in range(5)]
+    wa = make_wa_object(age_in_hours=1)
+    wa['permissions']['can_read'] = [wa['creator']['id']]
+    private = CRUD.create_anno(wa)
+    wa = make_wa_object(age_in_hours=1)
+    wa['platform']['collection_id'] = 'other_collection'
+    other = CRUD.create_anno(wa)
+    feed = 'context_id=fake_context&collection_id=fake_collection'
+
+    # too recent, writes might still be in flight
+    status, resp = changes(feed)
+    assert status == 200
+    assert resp['rows'] == []
+    assert resp['next_since'] is None
+
+    with patch('catchpy.anno.views.CATCH_CHANGES_FEED_LAG', 0):
+        # pages do not skip annos modified at the same time
+        seen = []
+        since = ''
+        has_more = True
+        while has_more:
+            status, resp = changes('{}&limit=2&since={}'.format(feed, since))
+            assert status == 200
+            seen.extend(a['id'] for a in resp['rows'])
+            since = resp['next_since']
+            has_more = resp['has_more']
+        assert sorted(seen) == sorted(a.anno_id for a in annos)
+
+        # nothing new
+        status, resp = changes('{}&since={}'.format(feed, since))
+        assert resp['rows'] == []
+        assert resp['next_since'] == since
+
+        # the owner sees the private anno
+        status, resp = changes(feed, user=private.creator_id)
+        assert private.anno_id in [a['id'] for a in resp['rows']]
+
+        # updates and deletes show up after `since`, in order
+        catcha = annos[0].serialized
+        catcha['body']['items'][0]['value'] = 'updated'
+        CRUD.update_anno(annos[0], catcha)
+        CRUD.delete_anno(annos[1])
+        status, resp = changes('{}&since={}'.format(feed, since))
+        assert [a['id'] for a in resp['rows']] == [
+            annos[0].anno_id, annos[1].anno_id]
+        assert resp['rows'][0]['body']['items'][0]['value'] == 'updated'
+        assert resp['rows'][1]['deleted'] is True
+        assert 'body' not in resp['rows'][1]
+
+        # whole context
+        status, resp = changes('context_id=fake_context')
+        assert other.anno_id in [a['id'] for a in resp['rows']]
+
+        assert changes('collection_id=fake_collection')[0] == 400
+        assert changes('{}&since=nonsense'.format(feed))[0] == 400
+
+
+@pytest.mark.django_db
+def test_suggest():
+    def suggest(query_string, user='reader'):
+        request = make_json_request(method='get', query_string=query_string)
+        request.catchjwt = make_jwt_payload(user=user)
+        response = suggest_api(request)
+        return response.status_code, json.loads(response.content.decode())
+
+    for (user, tags) in [
+            ('ann', ['sea', 'Seal']),
+            ('ann', ['sea', 'sky']),
+            ('bob', ['sea', 'sand'])]:
+        wa = make_wa_object(age_in_hours=1, user=user)
+        wa['body']['items'] = wa['body']['items'][:1] + [
+            make_wa_tag(t) for t in tags]
+        CRUD.create_anno(wa)
+    # private to carl, and deleted, are not counted
+    wa = make_wa_object(age_in_hours=1, user='carl')
+    wa['body']['items'].append(make_wa_tag('secret'))
+    wa['permissions']['can_read'] = ['carl']
+    CRUD.create_anno(wa)
+    wa = make_wa_object(age_in_hours=1, user='ann')
+    wa['body']['items'].append(make_wa_tag('seaweed'))
+    CRUD.delete_anno(CRUD.create_anno(wa))
+    # other context
+    wa = make_wa_object(age_in_hours=1, user='ann')
+    wa['platform']['context_id'] = 'other_context'
+    wa['body']['items'].append(make_wa_tag('seagull'))
+    CRUD.create_anno(wa)
+
+    # case-insensitive prefix, most used first
+    status, resp = suggest('context_id=fake_context&field=tag&prefix=SE')
+    assert status == 200
+    assert resp['rows'] == [
+        {'value': 'sea', 'count': 3}, {'value': 'Seal', 'count': 1}]
+    assert resp['size'] == 2
+
+    status, resp = suggest(
+        'context_id=fake_context&field=tag&prefix=se', user='carl')
+    assert {'value': 'secret', 'count': 1} in resp['rows']
+
+    status, resp = suggest(
+        'context_id=fake_context&field=username&prefix=USER_&limit=1')
+    assert resp['rows'] == [{'value': 'user_ann', 'count': 2}]
+
+    # no prefix is all values
+    status, resp = suggest('context_id=fake_context&field=username')
+    assert resp['rows'] == [
+        {'value': 'user_ann', 'count': 2}, {'value': 'user_bob', 'count': 1}]
+
+    assert suggest('field=tag&prefix=se')[0] == 400
+    assert suggest('context_id=fake_context&prefix=se')[0] == 400
+    assert suggest('context_id=fake_context&field=media')[0] == 400
+    assert suggest('context_id=fake_context&field=tag&limit=x')[0] == 400
+
+
+def reconnect():
+    connection.close()
+    # cached from the previous options
+    connection.features.__dict__.pop('uses_server_side_binding', None)
+
+
+@pytest.fixture
+def server_side_binding():
+    # cursor class is picked on connect, so it takes a new connection
+    options = connection.settings_dict['OPTIONS']
+    old_options = dict(options)
+    options['server_side_binding'] = True
+    reconnect()
+    yield
+    options.clear()
+    options.update(old_options)
+    reconnect()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_search_prepared_statements(server_side_binding):
+    for i in range(3):
+        CRUD.create_anno(make_wa_object(age_in_hours=30))
+    admin = make_jwt_payload(user=settings.CATCH_ADMIN_GROUP_ID)
+
+    def search(query_string):
+        request = make_json_request(method='get', query_string=query_string)
+        request.catchjwt = admin
+        response = search_api(request)
+        assert response.status_code == 200
+        return json.loads(response.content.decode('utf-8'))
+
+    with patch('catchpy.anno.search.CATCH_SEARCH_PREPARE_THRESHOLD', 1):
+        # the same shape, whatever the values
+        for userids in [['a'], ['b', 'c'], ['d', 'e', 'f']]:
+            search('userid={}&cursor='.format('&userid='.join(userids)))
+        stats = search('profile=true')['profile']['prepared_statements']
+
+    assert stats['statements']
+    assert stats['total_generic_plans'] + stats['total_custom_plans'] >= 4
+    page = [s for s in stats['statements'] if 'ANY' in s['sql']]
+    # prepared on the 2nd run, reused in the 3rd: count and page
+    assert len(page) == 2
+    for s in page:
+        assert s['generic_plans'] + s['custom_plans'] == 2
+
+    # off outside searches
+    assert connection.connection.prepare_threshold is None
+    # and with client-side binding
+    connection.settings_dict['OPTIONS']['server_side_binding'] = False
+    reconnect()
+    with patch('catchpy.anno.search.CATCH_SEARCH_PREPARE_THRESHOLD', 1):
+        assert 'prepared_statements' not in search('profile=true')['profile']
@@ -41,6 +41,18 @@ def test_urls():
         {
             'url': '/annos/123-456-789',
             'view_func': 'catchpy.anno.views.crud_api'},
+        {
+            'url': '/annos/_msearch',
+            'view_func': 'catchpy.anno.views.msearch_api'},
+        {
+            'url': '/annos/_changes',
+            'view_func': 'catchpy.anno.views.changes_api'},
+        {
+            'url': '/annos/_suggest',
+            'view_func': 'catchpy.anno.views.suggest_api'},
+        {
+            'url': '/annos/123-456-789/thread',
+            'view_func': 'catchpy.anno.views.thread_api'},
     ]
 
     for cfg in urlconf:
@@ -2,10 +2,21 @@ from django.urls import path
 from django.urls import re_path
 
 from . import views
+from .anno_defaults import CATCH_ASYNC_VIEWS
+
+# async views for search and reads, when served via asgi
+if CATCH_ASYNC_VIEWS:
+    search_back_compat_view = views.async_search_back_compat_api
+    crud_view = views.async_crud_api
+    create_or_search_view = views.async_create_or_search
+else:
+    search_back_compat_view = views.search_back_compat_api
+    crud_view = views.crud_api
+    create_or_search_view = views.create_or_search
 
 urlpatterns = [
     # these are for back-compat
-    re_path(r'^search', views.search_back_compat_api, name='compat_search'),
+    re_path(r'^search', search_back_compat_view, name='compat_search'),
     re_path(r'^create$', views.crud_compat_create, name='compat_create'),
     re_path(r'^update/(?P<anno_id>[0-9]+)$',
         views.crud_compat_update, name='compat_update'),
@@ -18,6 +29,12 @@ urlpatterns = [
 
     # these are for catchpy v2
     re_path(r'^copy', views.copy_api, name='copy_api'),
-    re_path(r'^(?P<anno_id>[0-9a-zA-z-]+)/?$', views.crud_api, name='crud_api'),
-    re_path(r'^$', views.create_or_search, name='create_or_search'),
+    # before crud_api, that would take it for an anno_id
+    re_path(r'^_msearch/?$', views.msearch_api, name='msearch_api'),
+    re_path(r'^_changes/?$', views.changes_api, name='changes_api'),
+    re_path(r'^_suggest/?$', views.suggest_api, name='suggest_api'),
+    re_path(r'^(?P<anno_id>[0-9a-zA-z-]+)/thread/?$',
+            views.thread_api, name='thread_api'),
+    re_path(r'^(?P<anno_id>[0-9a-zA-z-]+)/?$', crud_view, name='crud_api'),
+    re_path(r'^$', create_or_search_view, name='create_or_search'),
 ]
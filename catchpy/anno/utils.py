@@ -1,5 +1,13 @@
+import re
 from uuid import uuid4
 
+# media fragment temporal dimension in seconds, ex: t=10,20 t=npt:10.5 t=,20
+MEDIA_FRAGMENT_TIME = re.compile(
+    r'^t=(?:npt:)?(\d+(?:\.\d+)?)?(?:,(\d+(?:\.\d+)?))?$')
+# media fragment spatial dimension in pixels, ex: xywh=10,20,300,40
+MEDIA_FRAGMENT_XYWH = re.compile(
+    r'^xywh=(?:pixel:)?(-?[\d.]+),(-?[\d.]+),([\d.]+),([\d.]+)$')
+
 def string_to_number(text):
     '''try to convert string to int or float.
 
@@ -21,3 +29,91 @@ def generate_uid(must_be_int=False):
     # https://stackoverflow.com/a/3530326
     # https://developer.mozilla.org/en-US/docs/Web/JavaScript/Reference/Global_Objects/Number/MAX_SAFE_INTEGER
     return str(uuid4().int>>76 - 1) if must_be_int else str(uuid4())
+
+
+def _iter_selectors(selector):
+    '''selector, the items in a List/Choice, and their refinedBy, nested.'''
+    if isinstance(selector, list):
+        for s in selector:
+            yield from _iter_selectors(s)
+    elif isinstance(selector, dict):
+        yield selector
+        yield from _iter_selectors(selector.get('items', []))
+        yield from _iter_selectors(selector.get('refinedBy', []))
+        # oa specificResource, as the image annotation strategy in mirador
+        for key in ('selector', 'default', 'item'):
+            yield from _iter_selectors(selector.get(key, []))
+
+
+def _to_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def selector_ranges(target_item):
+    '''(text_range, time_range) covered by selectors in a catcha target item.
+
+    text_range is from TextPositionSelector offsets, time_range from media
+    fragments `t=start,end` in seconds; each a (start, end) tuple spanning
+    all selectors of its kind, or None if there's none. An open end is None.
+    RangeSelector is skipped: its offsets are relative to xpath nodes, not to
+    the text, so targets with only RangeSelector have no text_range.
+    '''
+    text_range = None
+    time_range = None
+    for s in _iter_selectors(target_item.get('selector', None)):
+        if s.get('type', None) == 'TextPositionSelector':
+            start = _to_number(s.get('start', None))
+            end = _to_number(s.get('end', None))
+            if start is None or end is None:
+                continue
+            start, end = int(min(start, end)), int(max(start, end))
+            if text_range is not None:
+                start = min(start, text_range[0])
+                end = max(end, text_range[1])
+            text_range = (start, end)
+
+        elif s.get('type', None) == 'FragmentSelector':
+            match = MEDIA_FRAGMENT_TIME.match(str(s.get('value', '')).strip())
+            if match is None:
+                continue
+            start = float(match.group(1) or 0)
+            end = _to_number(match.group(2))
+            if time_range is not None:
+                start = min(start, time_range[0])
+                if end is not None and time_range[1] is not None:
+                    end = max(end, time_range[1])
+                else:
+                    end = None
+            time_range = (start, end)
+
+    return (text_range, time_range)
+
+
+def selector_region(target_item):
+    '''(x1, y1, x2, y2) box around `xywh` fragments of a catcha image item.
+
+    spans all FragmentSelectors with an `xywh` in pixels, None if there's
+    none; svg selectors and `xywh=percent:` are not considered.
+    '''
+    region = None
+    for s in _iter_selectors(target_item.get('selector', None)):
+        if s.get('type', s.get('@type', None)) not in (
+                'FragmentSelector', 'oa:FragmentSelector'):
+            continue
+        match = MEDIA_FRAGMENT_XYWH.match(str(s.get('value', '')).strip())
+        if match is None:
+            continue
+        try:
+            (x, y, w, h) = [float(v) for v in match.groups()]
+        except ValueError:
+            continue
+        box = (x, y, x + w, y + h)
+        if region is not None:
+            box = (
+                min(box[0], region[0]), min(box[1], region[1]),
+                max(box[2], region[2]), max(box[3], region[3]))
+        region = box
+    return region
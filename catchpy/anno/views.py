@@ -1,11 +1,27 @@
+import copy
+import hashlib
 import json
 import logging
-from datetime import datetime
+import math
+from datetime import datetime, timedelta
 from http import HTTPStatus
-
-from django.db.models import Q
-from django.http import JsonResponse
+from itertools import islice
+
+import iso8601
+from asgiref.sync import sync_to_async
+from django.contrib.postgres.search import SearchHeadline, SearchRank
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, F, Max, Q, QuerySet
+from django.http import (
+    HttpResponseNotModified,
+    JsonResponse,
+    QueryDict,
+    StreamingHttpResponse,
+)
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
@@ -14,16 +30,29 @@ from .anno_defaults import (
     ANNOTATORJS_FORMAT,
     CATCH_ADMIN_GROUP_ID,
     CATCH_ANNO_FORMAT,
+    CATCH_CHANGES_FEED_LAG,
+    CATCH_DEFAULT_PLATFORM_NAME,
     CATCH_LOG_SEARCH_TIME,
+    CATCH_MSEARCH_LIMIT,
     CATCH_RESPONSE_LIMIT,
+    CATCH_SEARCH_CACHE_ALIAS,
+    CATCH_SEARCH_CACHE_TTL,
+    CATCH_SEARCH_COUNT_MODE,
+    CATCH_SEARCH_COUNT_MODE_BY_CONSUMER,
+    CATCH_SEARCH_STREAM_CHUNK_SIZE,
+    CATCH_SUGGEST_LIMIT,
+    COUNT_MODE_EXACT,
+    COUNT_MODE_NONE,
+    COUNT_MODE_WINDOW,
 )
 from .crud import CRUD
-from .decorators import require_catchjwt
+from .decorators import async_api_view, read_from_replica, require_catchjwt
 from .errors import (
     AnnoError,
     AnnotatorJSError,
     DuplicateAnnotationIdError,
     InvalidInputWebAnnotationError,
+    InvalidSearchParameterError,
     MethodNotAllowedError,
     MissingAnnotationError,
     MissingAnnotationInputError,
@@ -33,11 +62,33 @@ from .errors import (
 from .json_models import AnnoJS, Catcha
 from .models import Anno
 from .search import (
+    QueryLog,
+    acount_search_results,
+    awindow_total,
+    can_prepare_statements,
+    count_search_results,
+    encode_cursor,
+    explain_analyze,
+    facet_counts,
+    prepared_statement_stats,
+    prepared_statements,
+    query_after_cursor,
+    query_can_read,
+    query_changed_since,
+    query_date_range,
     query_tags,
     query_target_medias,
+    query_target_range,
+    query_target_region,
     query_target_sources,
     query_userid,
     query_username,
+    read_connection,
+    search_cache_key,
+    suggest_values,
+    text_search_query,
+    window_total,
+    with_window_total,
 )
 from .utils import generate_uid
 
@@ -136,42 +187,88 @@ def process_update(request, anno):
 @require_http_methods(["GET", "HEAD", "POST", "PUT", "DELETE", "OPTIONS"])
 @csrf_exempt
 @require_catchjwt
+@read_from_replica  # see [15] at the bottom
 def crud_api(request, anno_id):
     """view to deal with crud api requests."""
     try:
         resp = _do_crud_api(request, anno_id)
-    except AnnoError as e:
+    except (AnnoError, ValueError, KeyError) as e:
+        response = _crud_error_response(anno_id, e)
+    # no crud errors, try to convert to requested format
+    else:
+        response = _crud_response(request, anno_id, resp)
+
+    _log_crud_response(request, response)
+    return response
+
+
+@async_api_view(["GET", "HEAD", "POST", "PUT", "DELETE", "OPTIONS"])
+@require_catchjwt
+@read_from_replica  # see [15] at the bottom
+async def async_crud_api(request, anno_id):
+    """crud_api for asgi, reads with async orm; see [16] at the bottom."""
+    is_read = request.method == "GET" or request.method == "HEAD"
+    try:
+        if is_read:
+            resp = await _ado_read_anno(request, anno_id)
+        else:  # writes stay sync, in a transaction
+            resp = await sync_to_async(_do_crud_api)(request, anno_id)
+    except (AnnoError, ValueError, KeyError) as e:
+        response = _crud_error_response(anno_id, e)
+    else:
+        if is_read:  # replies already counted, formats with no queries
+            response = _crud_response(request, anno_id, resp)
+        else:
+            response = await sync_to_async(_crud_response)(request, anno_id, resp)
+
+    _log_crud_response(request, response)
+    return response
+
+
+def _crud_error_response(anno_id, e):
+    if isinstance(e, AnnoError):
         logger.error("anno({}): {}".format(anno_id, e), exc_info=True)
-        response = JsonResponse(
+        return JsonResponse(
             status=e.status, data={"status": e.status, "payload": [str(e)]}
         )
-    except (ValueError, KeyError) as e:
-        logger.error("anno({}): bad input: {}".format(anno_id, e), exc_info=True)
-        response = JsonResponse(
-            status=HTTPStatus.BAD_REQUEST,
-            data={"status": HTTPStatus.BAD_REQUEST, "payload": [str(e)]},
-        )
-    # no crud errors, try to convert to requested format
+    logger.error("anno({}): bad input: {}".format(anno_id, e), exc_info=True)
+    return JsonResponse(
+        status=HTTPStatus.BAD_REQUEST,
+        data={"status": HTTPStatus.BAD_REQUEST, "payload": [str(e)]},
+    )
+
+
+def _crud_response(request, anno_id, resp):
+    etag = None
+    if request.method == "GET" or request.method == "HEAD":
+        etag = get_anno_etag(resp)
+    if etag_matches(request, etag):  # see [12] at the bottom
+        return not_modified_response(etag)
+
+    response_format = CATCH_ANNO_FORMAT
+    try:
+        formatted_response = _format_response(resp, response_format)
+    except (AnnotatorJSError, UnknownResponseFormatError) as e:
+        # at this point, the requested operation is completed successfully
+        # returns 203 to say op was done, but can't return proper anno json
+        status = HTTPStatus.NON_AUTHORITATIVE_INFORMATION  # 203
+        error_response = {"id": resp.anno_id, "msg": str(e)}
+        logger.error("anno({}): {}".format(anno_id, e), exc_info=True)
+        response = JsonResponse(status=status, data=error_response)
     else:
-        response_format = CATCH_ANNO_FORMAT
-        try:
-            formatted_response = _format_response(resp, response_format)
-        except (AnnotatorJSError, UnknownResponseFormatError) as e:
-            # at this point, the requested operation is completed successfully
-            # returns 203 to say op was done, but can't return proper anno json
-            status = HTTPStatus.NON_AUTHORITATIVE_INFORMATION  # 203
-            error_response = {"id": resp.anno_id, "msg": str(e)}
-            logger.error("anno({}): {}".format(anno_id, e), exc_info=True)
-            response = JsonResponse(status=status, data=error_response)
-        else:
-            status = HTTPStatus.OK
-            response = JsonResponse(status=status, data=formatted_response)
-            if request.method == "POST" or request.method == "PUT":
-                # add response header with location for new resource
-                response["Location"] = request.build_absolute_uri(
-                    reverse("crud_api", kwargs={"anno_id": resp.anno_id})
-                )
+        status = HTTPStatus.OK
+        response = JsonResponse(status=status, data=formatted_response)
+        if request.method == "POST" or request.method == "PUT":
+            # add response header with location for new resource
+            response["Location"] = request.build_absolute_uri(
+                reverse("crud_api", kwargs={"anno_id": resp.anno_id})
+            )
+        elif etag is not None:
+            response["ETag"] = etag
+    return response
 
+
+def _log_crud_response(request, response):
     # info log
     logger.info(
         "[{0}] {1}:{2} {3} {4}".format(
@@ -182,12 +279,12 @@ def crud_api(request, anno_id):
             request.META["QUERY_STRING"],
         )
     )
-    return response
 
 
 @require_http_methods(["GET", "HEAD", "POST", "PUT", "DELETE", "OPTIONS"])
 @csrf_exempt
 @require_catchjwt
+@read_from_replica  # see [15] at the bottom
 def crud_compat_api(request, anno_id):
     """view to deal with crud api requests."""
     try:
@@ -269,8 +366,8 @@ def _do_crud_api(request, anno_id):
         )
     )
 
-    # retrieves anno
-    anno = CRUD.get_anno(anno_id)
+    # retrieves anno; reads get the replies count in the same query
+    anno = CRUD.get_anno(anno_id, with_total_replies=request.method in ("GET", "HEAD"))
 
     if anno is None:
         if request.method == "POST":
@@ -310,7 +407,31 @@ def _do_crud_api(request, anno_id):
     return r
 
 
-def _format_response(anno_result, response_format):
+async def _ado_read_anno(request, anno_id):
+    """the GET branch of _do_crud_api(), with async orm."""
+    logger.info(
+        "[{0}] {1} {2}/{3}".format(
+            request.catchjwt["consumerKey"],
+            request.method,
+            request.path,
+            anno_id,
+        )
+    )
+
+    anno = await CRUD.aget_anno(anno_id, with_total_replies=True)
+    if anno is None:
+        raise MissingAnnotationError("anno({}) not found".format(anno_id))
+
+    if not has_permission_for_op("read", request, anno):
+        raise NoPermissionForOperationError(
+            "no permission to read anno({}) for user({})".format(
+                anno_id, request.catchjwt["userId"]
+            )
+        )
+    return CRUD.read_anno(anno)
+
+
+def _format_response(anno_result, response_format, stream=False):
     # is it single anno or a QuerySet from search?
     is_single = isinstance(anno_result, Anno)
 
@@ -325,19 +446,27 @@ def _format_response(anno_result, response_format):
             raise UnknownResponseFormatError(
                 "unknown response format({})".format(response_format)
             )
+    elif stream:  # rows are formatted as they are written, see [5] at the bottom
+        if response_format not in (ANNOTATORJS_FORMAT, CATCH_ANNO_FORMAT):
+            raise UnknownResponseFormatError(
+                "unknown response format({})".format(response_format)
+            )
+        if isinstance(anno_result, QuerySet):
+            # pins the db now, as rows are read after the view returns
+            anno_result = anno_result.using(anno_result.db)
+        failed = []
+        response = {
+            "rows": _iter_format_rows(anno_result, response_format, failed),
+        }
+        if response_format == ANNOTATORJS_FORMAT:
+            response["failed"] = failed
     else:  # assume it's a QuerySet resulting from search
         response = {
             "rows": [],
         }
         if response_format == ANNOTATORJS_FORMAT:
-            failed = []
-            for anno in anno_result:
-                try:
-                    annojs = AnnoJS.convert_from_anno(anno)
-                except AnnotatorJSError as e:
-                    failed.append({"id": anno.anno_id, "msg": str(e)})
-                else:
-                    response["rows"].append(annojs)
+            # converts the whole page, prefetching in a fixed number of queries
+            response["rows"], failed = AnnoJS.convert_from_anno_list(anno_result)
             response["size"] = len(response["rows"])
             response["failed"] = failed
             response["size_failed"] = len(failed)
@@ -356,14 +485,110 @@ def _format_response(anno_result, response_format):
     return response
 
 
+def _iter_format_rows(anno_result, response_format, failed):
+    """formats search results chunk by chunk, read via server-side cursor."""
+    if isinstance(anno_result, QuerySet):
+        anno_result = anno_result.iterator(chunk_size=CATCH_SEARCH_STREAM_CHUNK_SIZE)
+    else:
+        anno_result = iter(anno_result)
+
+    chunk = list(islice(anno_result, CATCH_SEARCH_STREAM_CHUNK_SIZE))
+    while chunk:
+        if response_format == ANNOTATORJS_FORMAT:
+            rows, chunk_failed = AnnoJS.convert_from_anno_list(chunk)
+            failed.extend(chunk_failed)
+        else:
+            rows = [anno.serialized for anno in chunk]
+        for row in rows:
+            yield row
+        chunk = list(islice(anno_result, CATCH_SEARCH_STREAM_CHUNK_SIZE))
+
+
+def _stream_search_response(resp):
+    """writes search json envelope incrementally; rows first."""
+    rows = resp.pop("rows")
+    failed = resp.pop("failed", None)
+    size = 0
+    yield '{"rows": ['
+    for row in rows:
+        yield (", " if size else "") + json.dumps(row, cls=DjangoJSONEncoder)
+        size += 1
+    yield "], "
+
+    # rows are done, now the envelope is known
+    resp["size"] = size
+    if failed is not None:  # only back-compat fails to format rows
+        resp["failed"] = failed
+        resp["size_failed"] = len(failed)
+    yield json.dumps(resp, cls=DjangoJSONEncoder)[1:]
+
+
+def is_stream_request(request):
+    return request.GET.get("stream", "false").lower() in ("true", "1")
+
+
+def is_count_only_request(request):
+    """HEAD, or `count_only=true`, is for the total only."""
+    return request.method == "HEAD" or request.GET.get(
+        "count_only", "false"
+    ).lower() in ("true", "1")
+
+
+def _count_only_mode(request):
+    count_mode = get_count_mode(request)
+    if count_mode in (COUNT_MODE_NONE, COUNT_MODE_WINDOW):
+        # the total is all there is to send, with no page to count along
+        count_mode = COUNT_MODE_EXACT
+    return count_mode
+
+
+def _do_count_search_api(request, back_compat=False):
+    """total of a search, no rows fetched; see [21] at the bottom."""
+    count_mode = _count_only_mode(request)
+    # throws InvalidSearchParameterError
+    total = count_search_results(_search_query(request, back_compat), count_mode)
+    return {"total": total, "total_strategy": count_mode}
+
+
+async def _ado_count_search_api(request, back_compat=False):
+    """async version of _do_count_search_api()."""
+    count_mode = _count_only_mode(request)
+    # throws InvalidSearchParameterError
+    total = await acount_search_results(_search_query(request, back_compat), count_mode)
+    return {"total": total, "total_strategy": count_mode}
+
+
+def count_only_response(resp):
+    response = JsonResponse(status=HTTPStatus.OK, data=resp)
+    response["X-Total-Count"] = resp["total"]  # for HEAD, with no body
+    return response
+
+
 def partial_update_api(request, anno_id):
     pass
 
 
+@read_from_replica  # see [15] at the bottom
+@prepared_statements()  # see [14] at the bottom
 def search_api(request):
     # naomi note: always return catcha
     try:
-        resp = _do_search_api(request, back_compat=False)
+        if is_count_only_request(request):  # see [21] at the bottom
+            return count_only_response(_do_count_search_api(request))
+
+        etag = total = None
+        if wants_search_etag(request):
+            # one aggregate query, before running and formatting the page
+            etag, total = get_search_etag(request)
+            if etag_matches(request, etag):  # see [12] at the bottom
+                return not_modified_response(etag)
+
+        resp = _do_cached_search_api(request, back_compat=False, exact_total=total)
+
+        if is_stream_request(request):
+            return StreamingHttpResponse(
+                _stream_search_response(resp), content_type="application/json"
+            )
 
         logger.debug(
             (
@@ -378,7 +603,49 @@ def search_api(request):
             )
         )
 
-        return JsonResponse(status=HTTPStatus.OK, data=resp)
+        response = JsonResponse(status=HTTPStatus.OK, data=resp)
+        if etag is not None:
+            response["ETag"] = etag
+        return response
+
+    except AnnoError as e:
+        logger.error("search failed: {}".format(e), exc_info=True)
+        return JsonResponse(
+            status=e.status, data={"status": e.status, "payload": [str(e)]}
+        )
+
+    except Exception as e:
+        logger.error("search failed; request({})".format(request), exc_info=True)
+        return JsonResponse(
+            status=HTTPStatus.INTERNAL_SERVER_ERROR,
+            data={"status": HTTPStatus.INTERNAL_SERVER_ERROR, "payload": [str(e)]},
+        )
+
+
+@read_from_replica  # see [15] at the bottom
+async def async_search_api(request):
+    """search_api for asgi, with async orm; see [16] at the bottom."""
+    if is_stream_request(request) or is_profile_request(request):
+        # server-side cursors and captured queries are bound to a thread
+        return await sync_to_async(search_api)(request)
+
+    try:
+        if is_count_only_request(request):  # see [21] at the bottom
+            return count_only_response(await _ado_count_search_api(request))
+
+        etag = total = None
+        if wants_search_etag(request):
+            etag, total = await aget_search_etag(request)
+            if etag_matches(request, etag):  # see [12] at the bottom
+                return not_modified_response(etag)
+
+        resp = await _ado_cached_search_api(
+            request, back_compat=False, exact_total=total
+        )
+        response = JsonResponse(status=HTTPStatus.OK, data=resp)
+        if etag is not None:
+            response["ETag"] = etag
+        return response
 
     except AnnoError as e:
         logger.error("search failed: {}".format(e), exc_info=True)
@@ -386,46 +653,415 @@ def search_api(request):
             status=e.status, data={"status": e.status, "payload": [str(e)]}
         )
 
-    except Exception as e:
-        logger.error("search failed; request({})".format(request), exc_info=True)
-        return JsonResponse(
-            status=HTTPStatus.INTERNAL_SERVER_ERROR,
-            data={"status": HTTPStatus.INTERNAL_SERVER_ERROR, "payload": [str(e)]},
-        )
+    except Exception as e:
+        logger.error("search failed; request({})".format(request), exc_info=True)
+        return JsonResponse(
+            status=HTTPStatus.INTERNAL_SERVER_ERROR,
+            data={"status": HTTPStatus.INTERNAL_SERVER_ERROR, "payload": [str(e)]},
+        )
+
+
+@require_http_methods(["GET", "HEAD", "POST", "OPTIONS"])
+@csrf_exempt
+@require_catchjwt
+@read_from_replica(read_methods=("GET", "HEAD", "POST"))  # see [15] at the bottom
+@prepared_statements()  # see [14] at the bottom
+def search_back_compat_api(request):
+    try:
+        if is_count_only_request(request):  # see [21] at the bottom
+            response = count_only_response(
+                _do_count_search_api(request, back_compat=True)
+            )
+        else:
+            resp = _do_cached_search_api(request, back_compat=True)
+            if is_stream_request(request):
+                response = StreamingHttpResponse(
+                    _stream_search_response(resp), content_type="application/json"
+                )
+            else:
+                response = JsonResponse(status=HTTPStatus.OK, data=resp)
+
+    except AnnoError as e:
+        logger.error("search failed: {}".format(e), exc_info=True)
+        response = JsonResponse(
+            status=e.status, data={"status": e.status, "payload": [str(e)]}
+        )
+
+    except Exception as e:
+        logger.error("search failed; request({}): {}".format(request, e), exc_info=True)
+        response = JsonResponse(
+            status=HTTPStatus.INTERNAL_SERVER_ERROR,
+            data={"status": HTTPStatus.INTERNAL_SERVER_ERROR, "payload": [str(e)]},
+        )
+
+    # info log
+    logger.info(
+        "[{0}] {1}:{4} {2} {3}".format(
+            request.catchjwt["consumerKey"],
+            request.method,
+            request.path,
+            request.META["QUERY_STRING"],
+            response.status_code,
+        )
+    )
+    return response
+
+
+@async_api_view(["GET", "HEAD", "POST", "OPTIONS"])
+@require_catchjwt
+@read_from_replica(read_methods=("GET", "HEAD", "POST"))  # see [15] at the bottom
+async def async_search_back_compat_api(request):
+    """search_back_compat_api for asgi; see [16] at the bottom."""
+    if is_stream_request(request) or is_profile_request(request):
+        # server-side cursors and captured queries are bound to a thread
+        return await sync_to_async(search_back_compat_api)(request)
+
+    try:
+        if is_count_only_request(request):  # see [21] at the bottom
+            response = count_only_response(
+                await _ado_count_search_api(request, back_compat=True)
+            )
+        else:
+            resp = await _ado_cached_search_api(request, back_compat=True)
+            response = JsonResponse(status=HTTPStatus.OK, data=resp)
+
+    except AnnoError as e:
+        logger.error("search failed: {}".format(e), exc_info=True)
+        response = JsonResponse(
+            status=e.status, data={"status": e.status, "payload": [str(e)]}
+        )
+
+    except Exception as e:
+        logger.error("search failed; request({}): {}".format(request, e), exc_info=True)
+        response = JsonResponse(
+            status=HTTPStatus.INTERNAL_SERVER_ERROR,
+            data={"status": HTTPStatus.INTERNAL_SERVER_ERROR, "payload": [str(e)]},
+        )
+
+    # info log
+    logger.info(
+        "[{0}] {1}:{4} {2} {3}".format(
+            request.catchjwt["consumerKey"],
+            request.method,
+            request.path,
+            request.META["QUERY_STRING"],
+            response.status_code,
+        )
+    )
+    return response
+
+
+@require_http_methods(["GET", "HEAD", "OPTIONS"])
+@csrf_exempt
+@require_catchjwt
+def thread_api(request, anno_id):
+    """anno and all its replies, at any depth; see [11] at the bottom."""
+    try:
+        resp = _do_thread_api(request, anno_id)
+        response = JsonResponse(status=HTTPStatus.OK, data=resp)
+    except AnnoError as e:
+        logger.error("thread for anno({}): {}".format(anno_id, e), exc_info=True)
+        response = JsonResponse(
+            status=e.status, data={"status": e.status, "payload": [str(e)]}
+        )
+
+    # info log
+    logger.info(
+        "[{0}] {1}:{2} {3} {4}".format(
+            request.catchjwt["consumerKey"],
+            request.method,
+            response.status_code,
+            request.path,
+            request.META["QUERY_STRING"],
+        )
+    )
+    return response
+
+
+def _do_thread_api(request, anno_id):
+    anno = CRUD.get_anno(anno_id)
+    if anno is None:
+        raise MissingAnnotationError("anno({}) not found".format(anno_id))
+    if not has_permission_for_op("read", request, anno):
+        raise NoPermissionForOperationError(
+            "no permission to read anno({}) for user({})".format(
+                anno_id, request.catchjwt["userId"]
+            )
+        )
+
+    try:
+        depth = int(request.GET.get("depth", -1))
+        limit = int(request.GET.get("limit", CATCH_RESPONSE_LIMIT))
+    except ValueError as e:
+        raise InvalidSearchParameterError("invalid thread param: {}".format(e))
+    # negative means no limit, but size is still capped
+    depth = None if depth < 0 else depth
+    size = CATCH_RESPONSE_LIMIT if limit < 0 else min(limit, CATCH_RESPONSE_LIMIT)
+
+    response_format = request.GET.get("format", "catch").lower()
+    if response_format == "annotatorjs":
+        response_format = ANNOTATORJS_FORMAT
+    elif response_format == "catch":
+        response_format = CATCH_ANNO_FORMAT
+    else:
+        raise UnknownResponseFormatError(
+            "unknown response format({})".format(response_format)
+        )
+
+    # the anno itself was checked above, with overrides
+    readable_by = None if can_read_all(request) else request.catchjwt["userId"]
+    query = Anno._default_manager.thread(
+        anno_id, max_depth=depth, readable_by=readable_by
+    )
+    query = query.with_total_replies().order_by("created", "anno_id")
+
+    # fetch one extra row to know if the thread was cut short
+    rows = list(query[: size + 1])
+    response = _format_response(rows[:size], response_format)
+    response["id"] = anno_id
+    response["depth"] = depth
+    response["limit"] = limit
+    response["truncated"] = len(rows) > size
+    return response
+
+
+@require_http_methods(["GET", "HEAD", "OPTIONS"])
+@csrf_exempt
+@require_catchjwt
+def changes_api(request):
+    """annos created, updated or deleted since a point; see [13] at the bottom."""
+    try:
+        resp = _do_changes_api(request)
+        response = JsonResponse(status=HTTPStatus.OK, data=resp)
+    except AnnoError as e:
+        logger.error("changes failed: {}".format(e), exc_info=True)
+        response = JsonResponse(
+            status=e.status, data={"status": e.status, "payload": [str(e)]}
+        )
+
+    # info log
+    logger.info(
+        "[{0}] {1}:{2} {3} {4}".format(
+            request.catchjwt["consumerKey"],
+            request.method,
+            response.status_code,
+            request.path,
+            request.META["QUERY_STRING"],
+        )
+    )
+    return response
+
+
+def _do_changes_api(request):
+    context_id = request.GET.get("context_id", None)
+    collection_id = request.GET.get("collection_id", None)
+    if not context_id:
+        raise InvalidSearchParameterError("changes feed requires `context_id`")
+
+    try:
+        limit = int(request.GET.get("limit", CATCH_RESPONSE_LIMIT))
+    except ValueError as e:
+        raise InvalidSearchParameterError("invalid changes param: {}".format(e))
+    # negative means no limit, but size is still capped
+    size = CATCH_RESPONSE_LIMIT if limit < 0 else min(limit, CATCH_RESPONSE_LIMIT)
+
+    # soft-deleted are not filtered out, they are sent as tombstones
+    query = Anno._default_manager.filter(context_id=context_id)
+    if collection_id:
+        query = query.filter(collection_id=collection_id)
+    if not can_read_all(request):
+        query = query.filter(query_can_read(request.catchjwt["userId"]))
+
+    # writes still in flight might commit with an earlier `modified`
+    until = timezone.now() - timedelta(seconds=CATCH_CHANGES_FEED_LAG)
+    query = query.filter(modified__lte=until)
+
+    since = request.GET.get("since", None)
+    if since:  # empty or missing `since` means from the start
+        # throws InvalidSearchParameterError
+        query = query.filter(query_changed_since(since))
+    query = query.with_total_replies().order_by("modified", "anno_id")
+
+    # fetch one extra row to know if there are more changes
+    rows = list(query[: size + 1])
+    has_more = len(rows) > size
+    rows = rows[:size]
+
+    changes = []
+    for anno in rows:
+        if anno.anno_deleted:
+            changes.append(
+                {
+                    "id": anno.anno_id,
+                    "deleted": True,
+                    "modified": anno.modified.replace(microsecond=0).isoformat(),
+                }
+            )
+        else:
+            changes.append(anno.serialized)
+
+    return {
+        "rows": changes,
+        "size": len(changes),
+        "limit": limit,
+        "since": since,
+        # to be sent as `since` in the next request
+        "next_since": encode_cursor(rows[-1], field="modified") if rows else since,
+        "has_more": has_more,
+    }
+
+
+@require_http_methods(["GET", "HEAD", "OPTIONS"])
+@csrf_exempt
+@require_catchjwt
+@read_from_replica  # see [15] at the bottom
+def suggest_api(request):
+    """tags or usernames starting with a prefix; see [19] at the bottom."""
+    try:
+        resp = _do_suggest_api(request)
+        response = JsonResponse(status=HTTPStatus.OK, data=resp)
+    except AnnoError as e:
+        logger.error("suggest failed: {}".format(e), exc_info=True)
+        response = JsonResponse(
+            status=e.status, data={"status": e.status, "payload": [str(e)]}
+        )
+
+    # info log
+    logger.info(
+        "[{0}] {1}:{2} {3} {4}".format(
+            request.catchjwt["consumerKey"],
+            request.method,
+            response.status_code,
+            request.path,
+            request.META["QUERY_STRING"],
+        )
+    )
+    return response
+
+
+def _do_suggest_api(request):
+    context_id = request.GET.get("context_id", None)
+    collection_id = request.GET.get("collection_id", None)
+    if not context_id:
+        raise InvalidSearchParameterError("suggest requires `context_id`")
+    field = request.GET.get("field", None)
+    if not field:
+        raise InvalidSearchParameterError("suggest requires `field`")
+    prefix = request.GET.get("prefix", "")
+
+    try:
+        limit = int(request.GET.get("limit", CATCH_SUGGEST_LIMIT))
+    except ValueError as e:
+        raise InvalidSearchParameterError("invalid suggest param: {}".format(e))
+    # negative means no limit, but size is still capped
+    size = CATCH_RESPONSE_LIMIT if limit < 0 else min(limit, CATCH_RESPONSE_LIMIT)
+
+    query = Anno._default_manager.filter(anno_deleted=False, context_id=context_id)
+    if collection_id:
+        query = query.filter(collection_id=collection_id)
+    if not can_read_all(request):
+        query = query.filter(query_can_read(request.catchjwt["userId"]))
+
+    # throws InvalidSearchParameterError
+    rows = suggest_values(query, field, prefix=prefix, limit=size)
+    return {
+        "field": field,
+        "prefix": prefix,
+        "rows": rows,
+        "size": len(rows),
+    }
 
 
-@require_http_methods(["GET", "HEAD", "POST", "OPTIONS"])
+@require_http_methods(["POST", "OPTIONS"])
 @csrf_exempt
 @require_catchjwt
-def search_back_compat_api(request):
+@read_from_replica(read_methods=("POST",))  # see [15] at the bottom
+@prepared_statements()  # see [14] at the bottom
+def msearch_api(request):
+    """runs a list of searches in one request; see [10] at the bottom."""
     try:
-        resp = _do_search_api(request, back_compat=True)
-        response = JsonResponse(status=HTTPStatus.OK, data=resp)
-
+        searches = get_msearch_input(request)
     except AnnoError as e:
-        logger.error("search failed: {}".format(e), exc_info=True)
-        response = JsonResponse(
+        logger.error("msearch failed: {}".format(e), exc_info=True)
+        return JsonResponse(
             status=e.status, data={"status": e.status, "payload": [str(e)]}
         )
 
-    except Exception as e:
-        logger.error("search failed; request({}): {}".format(request, e), exc_info=True)
-        response = JsonResponse(
-            status=HTTPStatus.INTERNAL_SERVER_ERROR,
-            data={"status": HTTPStatus.INTERNAL_SERVER_ERROR, "payload": [str(e)]},
-        )
+    responses = []
+    done = {}  # identical searches run once
+    for params, back_compat in searches:
+        key = json.dumps([sorted(params.items()), back_compat])
+        if key not in done:
+            done[key] = _do_msearch_item(request, params, back_compat)
+        responses.append(done[key])
 
-    # info log
     logger.info(
-        "[{0}] {1}:{4} {2} {3}".format(
+        "[{0}] {1}:200 {2} searches({3}) distinct({4})".format(
             request.catchjwt["consumerKey"],
             request.method,
             request.path,
-            request.META["QUERY_STRING"],
-            response.status_code,
+            len(searches),
+            len(done),
         )
     )
-    return response
+    return JsonResponse(status=HTTPStatus.OK, data={"responses": responses})
+
+
+def get_msearch_input(request):
+    """list of (params, back_compat) from _msearch json body."""
+    try:
+        body = get_input_json(request)
+    except ValueError as e:
+        raise InvalidSearchParameterError("invalid json for _msearch: {}".format(e))
+    searches = body.get("searches", None) if isinstance(body, dict) else None
+    if not isinstance(searches, list):
+        raise InvalidSearchParameterError("_msearch expects a `searches` list")
+    if len(searches) > CATCH_MSEARCH_LIMIT:
+        raise InvalidSearchParameterError(
+            "too many searches({}) for _msearch, max is {}".format(
+                len(searches), CATCH_MSEARCH_LIMIT
+            )
+        )
+
+    result = []
+    for search in searches:
+        params = search.get("params", {}) if isinstance(search, dict) else None
+        if not isinstance(params, dict):
+            raise InvalidSearchParameterError(
+                "_msearch items expect `params` object, found({})".format(search)
+            )
+        # querystring style: a value or a list of values
+        params = {
+            str(k): [str(x) for x in v] if isinstance(v, list) else [str(v)]
+            for k, v in params.items()
+        }
+        result.append((params, bool(search.get("back_compat", False))))
+    return result
+
+
+def _do_msearch_item(request, params, back_compat=False):
+    """search response for one set of params, or its error."""
+    query = QueryDict(mutable=True)
+    for k, v in params.items():
+        query.setlist(k, v)
+
+    # same jwt, same connection; only the querystring changes
+    search_request = copy.copy(request)
+    search_request.GET = query
+    search_request.META = dict(request.META, QUERY_STRING=query.urlencode())
+
+    try:
+        if is_stream_request(search_request):
+            raise InvalidSearchParameterError("cannot stream searches in _msearch")
+        if is_count_only_request(search_request):  # see [21] at the bottom
+            return _do_count_search_api(search_request, back_compat=back_compat)
+        return _do_cached_search_api(search_request, back_compat=back_compat)
+    except AnnoError as e:
+        logger.error("msearch item failed: {}".format(e), exc_info=True)
+        return {"status": e.status, "payload": [str(e)]}
+    except Exception as e:
+        logger.error("msearch item failed: {}".format(e), exc_info=True)
+        return {"status": HTTPStatus.INTERNAL_SERVER_ERROR, "payload": [str(e)]}
 
 
 def step_in_time(delta_list=None):
@@ -438,7 +1074,342 @@ def step_in_time(delta_list=None):
     delta_list.append((ts, d))
 
 
-def _do_search_api(request, back_compat=False):
+def get_count_mode(request):
+    """count mode for search `total`: per request, per consumer, or default."""
+    count_mode = request.GET.get("count", None)
+    if not count_mode:
+        count_mode = CATCH_SEARCH_COUNT_MODE_BY_CONSUMER.get(
+            request.catchjwt["consumerKey"], CATCH_SEARCH_COUNT_MODE
+        )
+    return count_mode
+
+
+def get_text_search_query(request, back_compat=False):
+    """full-text query for the `text` param, or None."""
+    text = request.GET.get("text", None)
+    if not text:
+        return None
+    if back_compat:  # annotatorjs annos are all in the default platform
+        platform_name = CATCH_DEFAULT_PLATFORM_NAME
+    else:
+        platform_name = request.GET.get("platform", None)
+    return text_search_query(text, platform_name)
+
+
+def get_target_range(request):
+    """(range_start, range_end) as numbers; None if not in request."""
+    window = []
+    for param in ("range_start", "range_end"):
+        value = request.GET.get(param, None)
+        if value is None or value == "":
+            window.append(None)
+            continue
+        try:
+            window.append(float(value))
+        except ValueError:
+            raise InvalidSearchParameterError(
+                "`{}` should be a number, found({})".format(param, value)
+            )
+        if not math.isfinite(window[-1]):
+            raise InvalidSearchParameterError(
+                "`{}` should be a finite number, found({})".format(param, value)
+            )
+    if None not in window and window[0] > window[1]:
+        raise InvalidSearchParameterError(
+            "`range_start` should not be after `range_end`"
+        )
+    return tuple(window)
+
+
+def get_date_range(request, field):
+    """(after, before) datetimes from `<field>_after` and `<field>_before`."""
+    window = []
+    for param in ("{}_after".format(field), "{}_before".format(field)):
+        value = request.GET.get(param, None)
+        if not value:
+            window.append(None)
+            continue
+        try:  # no timezone means utc
+            window.append(iso8601.parse_date(value))
+        except iso8601.ParseError:
+            raise InvalidSearchParameterError(
+                "`{}` should be an iso8601 datetime, found({})".format(param, value)
+            )
+    return tuple(window)
+
+
+def get_bbox(request):
+    """(x, y, w, h) from `bbox=x,y,w,h`; None if not in request."""
+    value = request.GET.get("bbox", None)
+    if not value:
+        return None
+    try:
+        bbox = tuple(float(v) for v in value.split(","))
+    except ValueError:
+        bbox = ()
+    if (
+        len(bbox) != 4
+        or not all(math.isfinite(v) for v in bbox)
+        or bbox[2] < 0
+        or bbox[3] < 0
+    ):
+        raise InvalidSearchParameterError(
+            "`bbox` should be x,y,w,h with w,h >= 0, found({})".format(value)
+        )
+    return bbox
+
+
+def is_highlight_request(request):
+    return request.GET.get("highlight", "false").lower() in ("true", "1")
+
+
+def can_read_all(request):
+    """True if requesting user is allowed to read private annotations."""
+    payload = request.catchjwt
+    return (
+        "CAN_READ" in payload.get("override", [])
+        or payload["userId"] == CATCH_ADMIN_GROUP_ID
+    )
+
+
+def get_read_scope(request):
+    """who can read the results of a search, as these depend on permissions."""
+    if can_read_all(request):
+        return "*"
+    return "userid:{}".format(request.catchjwt["userId"])
+
+
+def get_search_platform(request, back_compat=False):
+    """(context_id, collection_id) a search is restricted to, if any."""
+    if back_compat:
+        context_id = request.GET.get("contextId", None)
+        if context_id is None:  # forward-compat!!! see [1] at the bottom
+            context_id = request.GET.get("context_id", None)
+        collection_id = request.GET.get("collectionId", None)
+        if collection_id is None:  # forward-compat!!! see [1] at the bottom
+            collection_id = request.GET.get("collection_id", None)
+    else:
+        context_id = request.GET.get("context_id", None)
+        collection_id = request.GET.get("collection_id", None)
+    return (context_id, collection_id)
+
+
+def get_facet_names(request):
+    """facets asked as `facets=tag,media` or repeated `facets` params."""
+    names = []
+    for value in request.GET.getlist("facets", []):
+        for name in value.split(","):
+            name = name.strip()
+            if name and name not in names:
+                names.append(name)
+    return names
+
+
+def make_weak_etag(values):
+    digest = hashlib.sha1(
+        json.dumps(values, cls=DjangoJSONEncoder).encode("utf-8")
+    ).hexdigest()
+    return 'W/"{}"'.format(digest)
+
+
+def get_anno_etag(anno):
+    """weak etag for reading an anno; see [12] at the bottom."""
+    return make_weak_etag([anno.anno_id, anno.modified, anno.total_replies])
+
+
+def wants_search_etag(request):
+    """True if a search is to send an etag; see [12] at the bottom."""
+    if is_stream_request(request) or is_profile_request(request):
+        return False
+    # with an exact count, the etag aggregate is the count query
+    return (
+        get_count_mode(request) == COUNT_MODE_EXACT
+        or "HTTP_IF_NONE_MATCH" in request.META
+    )
+
+
+def get_search_etag(request, back_compat=False):
+    """(weak etag, exact total) for a search; see [12] at the bottom.
+
+    total is None if the etag came from cache.
+    """
+    # cached along with the response, invalidated by the same writes
+    key = get_search_cache_key(request, back_compat)
+    if key is not None:
+        key = "{}:etag".format(key)
+        etag = caches[CATCH_SEARCH_CACHE_ALIAS].get(key)
+        if etag is not None:
+            return (etag, None)
+
+    stats = _search_etag_query(request, back_compat).aggregate(
+        **_search_etag_aggregates()
+    )
+    etag = _make_search_etag(request, back_compat, stats)
+    if key is not None:
+        caches[CATCH_SEARCH_CACHE_ALIAS].set(key, etag, CATCH_SEARCH_CACHE_TTL)
+    return (etag, stats["count"])
+
+
+async def aget_search_etag(request, back_compat=False):
+    """async version of get_search_etag()."""
+    key = get_search_cache_key(request, back_compat)
+    if key is not None:
+        key = "{}:etag".format(key)
+        etag = await caches[CATCH_SEARCH_CACHE_ALIAS].aget(key)
+        if etag is not None:
+            return (etag, None)
+
+    stats = await _search_etag_query(request, back_compat).aaggregate(
+        **_search_etag_aggregates()
+    )
+    etag = _make_search_etag(request, back_compat, stats)
+    if key is not None:
+        await caches[CATCH_SEARCH_CACHE_ALIAS].aset(key, etag, CATCH_SEARCH_CACHE_TTL)
+    return (etag, stats["count"])
+
+
+def _search_etag_query(request, back_compat=False):
+    return _search_query(request, back_compat).with_last_reply_modified()
+
+
+def _search_etag_aggregates():
+    return {
+        "count": Count("*"),
+        "last_modified": Max("modified"),
+        # replies move `totalReplies` of the annos in the page
+        "last_reply": Max("last_reply_modified"),
+    }
+
+
+def _make_search_etag(request, back_compat, stats):
+    params = list(request.GET.lists())
+    # count mode might come from consumer config
+    params.append(("__count_mode__", [get_count_mode(request)]))
+    return make_weak_etag(
+        [
+            sorted(params),
+            back_compat,
+            get_read_scope(request),
+            stats["count"],
+            stats["last_modified"],
+            stats["last_reply"],
+        ]
+    )
+
+
+def etag_matches(request, etag):
+    """True if `etag` is in If-None-Match, by weak comparison."""
+    header = request.META.get("HTTP_IF_NONE_MATCH", "")
+    if etag is None or not header:
+        return False
+    etags = [e[2:] if e.startswith("W/") else e for e in parse_etags(header)]
+    return "*" in etags or etag[2:] in etags
+
+
+def not_modified_response(etag):
+    response = HttpResponseNotModified()
+    response["ETag"] = etag
+    return response
+
+
+def is_profile_request(request):
+    return request.GET.get("profile", "false").lower() in ("true", "1")
+
+
+def can_profile(request):
+    """True if requesting user is allowed to see search query plans."""
+    payload = request.catchjwt
+    return (
+        "CAN_PROFILE" in payload.get("override", [])
+        or payload["userId"] == CATCH_ADMIN_GROUP_ID
+    )
+
+
+def _do_profiled_search_api(request, back_compat=False):
+    """search response with sql, plans and timings; see [9] at the bottom."""
+    if not can_profile(request):
+        raise NoPermissionForOperationError(
+            "no permission to profile search for user({})".format(
+                request.catchjwt["userId"]
+            )
+        )
+    if is_stream_request(request):
+        raise InvalidSearchParameterError("search profile cannot be streamed")
+
+    query_log = QueryLog()
+    with read_connection().execute_wrapper(query_log):
+        response = _do_search_api(request, back_compat, profile=True)
+
+    queries = []
+    for q in query_log.queries:
+        queries.append(
+            {
+                "sql": q["sql"],
+                "time": round(q["time"], 3),
+                # runs the query again, with EXPLAIN (ANALYZE, BUFFERS)
+                "plan": explain_analyze(q["raw_sql"], q["params"]),
+            }
+        )
+    response["profile"]["queries"] = queries
+    response["profile"]["total_queries"] = len(queries)
+    if can_prepare_statements():
+        response["profile"]["prepared_statements"] = prepared_statement_stats()
+    return response
+
+
+def get_search_cache_key(request, back_compat=False):
+    """key for the search response in cache, None if not to be cached."""
+    if CATCH_SEARCH_CACHE_TTL <= 0 or is_stream_request(request):
+        return None
+
+    read_scope = get_read_scope(request)
+    context_id, collection_id = get_search_platform(request, back_compat)
+    params = list(request.GET.lists())
+    # count mode might come from consumer config
+    params.append(("__count_mode__", [get_count_mode(request)]))
+    params.append(("__back_compat__", [back_compat]))
+    return search_cache_key(params, read_scope, context_id, collection_id)
+
+
+def _do_cached_search_api(request, back_compat=False, exact_total=None):
+    """search response, from cache when enabled; see [7] at the bottom.
+
+    `exact_total`, if known already, saves the count in exact count mode.
+    """
+    if is_profile_request(request):
+        return _do_profiled_search_api(request, back_compat)
+
+    key = get_search_cache_key(request, back_compat)
+    if key is None:
+        return _do_search_api(request, back_compat, exact_total=exact_total)
+
+    cache = caches[CATCH_SEARCH_CACHE_ALIAS]
+    response = cache.get(key)
+    if response is None:
+        response = _do_search_api(request, back_compat, exact_total=exact_total)
+        cache.set(key, response, CATCH_SEARCH_CACHE_TTL)
+    else:
+        logger.debug("[SEARCH CACHE] hit for {}".format(request.META["QUERY_STRING"]))
+    return response
+
+
+async def _ado_cached_search_api(request, back_compat=False, exact_total=None):
+    """async version of _do_cached_search_api(), but for profiling."""
+    key = get_search_cache_key(request, back_compat)
+    if key is None:
+        return await _ado_search_api(request, back_compat, exact_total=exact_total)
+
+    cache = caches[CATCH_SEARCH_CACHE_ALIAS]
+    response = await cache.aget(key)
+    if response is None:
+        response = await _ado_search_api(request, back_compat, exact_total=exact_total)
+        await cache.aset(key, response, CATCH_SEARCH_CACHE_TTL)
+    else:
+        logger.debug("[SEARCH CACHE] hit for {}".format(request.META["QUERY_STRING"]))
+    return response
+
+
+def _do_search_api(request, back_compat=False, profile=False, exact_total=None):
     # prep to count how long a search is taking
     ts_deltas = step_in_time()
 
@@ -452,70 +1423,47 @@ def _do_search_api(request, back_compat=False):
         )
     )
 
-    payload = request.catchjwt
-
-    # filter out the soft-deleted
-    query = Anno._default_manager.filter(anno_deleted=False)
-
-    # TODO: check override POLICIES (override allow private reads)
-    if (
-        "CAN_READ" not in payload.get("override", [])
-        and request.catchjwt["userId"] != CATCH_ADMIN_GROUP_ID
-    ):
-        # filter out permission cannot_read
-        q = Q(can_read__len=0) | Q(can_read__contains=[payload["userId"]])
-        query = query.filter(q)
-
-    if back_compat:
-        query = process_search_back_compat_params(request, query)
-    else:
-        query = process_search_params(request, query)
+    search = _plan_search(request, back_compat)
 
     # delta[1] - process search params
     step_in_time(ts_deltas)
 
-    # sort by created date, descending (more recent first)
-    query = query.order_by("-created")
-
-    # max results and offset
-    try:
-        limit = int(request.GET.get("limit", 10))
-    except ValueError:
-        limit = CATCH_RESPONSE_LIMIT
-
-    try:
-        offset = int(request.GET.get("offset", 0))
-    except ValueError:
-        offset = 0
-
-    # calculate response size
-    total = query.count()
-    if limit < 0:  # limit -1 means complete result, limit response size
-        size = (
-            CATCH_RESPONSE_LIMIT
-            if (total - offset) > CATCH_RESPONSE_LIMIT
-            else (total - offset)
-        )
+    # counts per facet over the filtered search, see [8] at the bottom
+    facets = None
+    if search["facet_names"]:
+        facets = facet_counts(search["query"], search["facet_names"])
+
+    if search["window_count"]:
+        # page and total in one query, see [21] at the bottom
+        q_result = list(search["page_query"])
+        total = window_total(q_result, search["count_query"])
+    elif exact_total is not None and search["count_mode"] == COUNT_MODE_EXACT:
+        total = exact_total  # counted along with the etag, see [12] at the bottom
     else:
-        size = limit
+        # calculate response size
+        # throws InvalidSearchParameterError
+        total = count_search_results(search["count_query"], search["count_mode"])
 
     # delta[2]
     step_in_time(ts_deltas)
 
-    q_result = query[offset : (offset + size)]
+    next_cursor = None
+    if search["cursor"] is not None:
+        q_result, next_cursor = _cursor_page(list(search["page_query"]), search)
+    elif not search["window_count"]:  # else fetched along with the total
+        q_result = search["page_query"]
+        if profile:  # fetch now, so it's not timed as formatting
+            q_result = list(q_result)
 
     # delta[3]
     step_in_time(ts_deltas)
 
-    if back_compat:
-        response_format = ANNOTATORJS_FORMAT
-    else:
-        response_format = CATCH_ANNO_FORMAT
-
     # delta[4] - just before formatting
     step_in_time(ts_deltas)
 
-    response = _format_response(q_result, response_format)
+    response = _format_response(
+        q_result, search["response_format"], stream=is_stream_request(request)
+    )
 
     # delta[5] - how  long to format
     step_in_time(ts_deltas)
@@ -534,12 +1482,220 @@ def _do_search_api(request, back_compat=False):
                 (datetime.utcnow() - ts_deltas[0][0]).total_seconds(),
             )
         )
+    _add_search_info(response, search, total, next_cursor, facets)
+    if profile:
+        response["profile"] = {
+            "timings": {  # in seconds
+                "prep": ts_deltas[1][1].total_seconds(),
+                "count": ts_deltas[2][1].total_seconds(),
+                "fetch": ts_deltas[3][1].total_seconds(),
+                "format": ts_deltas[5][1].total_seconds(),
+                "total": (datetime.utcnow() - ts_deltas[0][0]).total_seconds(),
+            },
+        }
+    return response
+
+
+async def _ado_search_api(request, back_compat=False, exact_total=None):
+    """_do_search_api() with async orm; see [16] at the bottom."""
+    logger.info(
+        "[{3}] {0} {1} {2}".format(
+            request.method,
+            request.path,
+            request.META["QUERY_STRING"],
+            request.catchjwt["consumerKey"],
+        )
+    )
+
+    search = _plan_search(request, back_compat)
+
+    facets = None
+    if search["facet_names"]:
+        facets = await sync_to_async(facet_counts)(
+            search["query"], search["facet_names"]
+        )
+
+    q_result = [anno async for anno in search["page_query"]]
+    if search["window_count"]:  # see [21] at the bottom
+        total = await awindow_total(q_result, search["count_query"])
+    elif exact_total is not None and search["count_mode"] == COUNT_MODE_EXACT:
+        total = exact_total  # counted along with the etag, see [12] at the bottom
+    else:
+        # throws InvalidSearchParameterError
+        total = await acount_search_results(search["count_query"], search["count_mode"])
+    next_cursor = None
+    if search["cursor"] is not None:
+        q_result, next_cursor = _cursor_page(q_result, search)
+
+    if search["response_format"] == CATCH_ANNO_FORMAT:
+        # replies already counted, formats with no queries
+        response = _format_response(q_result, CATCH_ANNO_FORMAT)
+    else:  # annotatorjs prefetches related rows
+        response = await sync_to_async(_format_response)(
+            q_result, search["response_format"]
+        )
+
+    _add_search_info(response, search, total, next_cursor, facets)
+    return response
+
+
+def _plan_search(request, back_compat=False):
+    """querysets and paging for a search, as a dict; no queries run yet.
+
+    throws InvalidSearchParameterError.
+    """
+    query = _search_query(request, back_compat)
+
+    facet_names = []
+    if not back_compat:
+        facet_names = get_facet_names(request)
+    facet_query = query
+
+    # count replies in the page query, not once per row
+    query = query.with_total_replies()
+
+    # keyset pagination is opt-in, see [4] at the bottom
+    cursor = request.GET.get("cursor", request.GET.get("after", None))
+
+    text_query = get_text_search_query(request, back_compat)
+    if request.GET.get("sort", None) == "relevance":  # see [6] at the bottom
+        if text_query is None:
+            raise InvalidSearchParameterError("sort by relevance requires `text`")
+        if cursor is not None:
+            raise InvalidSearchParameterError(
+                "sort by relevance cannot be paged by `cursor`"
+            )
+        query = query.annotate(
+            text_rank=SearchRank(F("search_vector"), text_query)
+        ).order_by("-text_rank", "-created", "-anno_id")
+    else:
+        # sort by created date, descending (more recent first)
+        # anno_id breaks ties, so pages are stable for keyset pagination
+        query = query.order_by("-created", "-anno_id")
+    count_query = query
+
+    # max results and offset
+    try:
+        limit = int(request.GET.get("limit", 10))
+    except ValueError:
+        limit = CATCH_RESPONSE_LIMIT
+
+    try:
+        offset = int(request.GET.get("offset", 0))
+    except ValueError:
+        offset = 0
+
+    if cursor is not None:
+        offset = 0  # offset is ignored when paging by cursor
+    # limit -1 means complete result, limit response size
+    size = CATCH_RESPONSE_LIMIT if limit < 0 else limit
+
+    if text_query is not None and is_highlight_request(request):
+        # only computed for the rows in the page, after counting
+        query = query.annotate(
+            text_headline=SearchHeadline(
+                "body_text", text_query, config=text_query.config
+            )
+        )
+
+    count_mode = get_count_mode(request)
+    # total along with the page, see [21] at the bottom; cursor pages filter
+    # out the rows before the cursor, so the window would not count those
+    window_count = count_mode == COUNT_MODE_WINDOW and cursor is None
+
+    if cursor is not None:
+        if cursor:  # empty cursor means first page
+            # throws InvalidSearchParameterError
+            query = query.filter(query_after_cursor(cursor))
+        # fetch one extra row to know if there's a next page
+        page_query = query[: size + 1]
+    elif window_count:
+        page_query = with_window_total(query)[offset : (offset + size)]
+    else:
+        page_query = query[offset : (offset + size)]
+
+    if back_compat:
+        response_format = ANNOTATORJS_FORMAT
+    else:
+        response_format = CATCH_ANNO_FORMAT
+
+    return {
+        "query": facet_query,
+        "facet_names": facet_names,
+        "count_query": count_query,
+        "count_mode": count_mode,
+        "window_count": window_count,
+        "page_query": page_query,
+        "cursor": cursor,
+        "limit": limit,
+        "offset": offset,
+        "size": size,
+        "response_format": response_format,
+    }
+
+
+def _cursor_page(rows, search):
+    """(rows in page, next_cursor) from the size+1 rows fetched by cursor."""
+    next_cursor = None
+    size = search["size"]
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor(rows[-1]) if rows else None
+    return (rows, next_cursor)
+
+
+def _add_search_info(response, search, total, next_cursor=None, facets=None):
     response["total"] = total  # add response info
-    response["limit"] = limit
-    response["offset"] = offset
+    response["total_strategy"] = search["count_mode"]
+    response["limit"] = search["limit"]
+    response["offset"] = search["offset"]
+    if search["cursor"] is not None:
+        response["next_cursor"] = next_cursor
+    if facets is not None:
+        response["facets"] = facets
     return response
 
 
+def _search_query(request, back_compat=False):
+    """annos the search matches, with no ordering or paging."""
+    # filter out the soft-deleted
+    query = Anno._default_manager.filter(anno_deleted=False)
+
+    # TODO: check override POLICIES (override allow private reads)
+    if not can_read_all(request):
+        # filter out permission cannot_read
+        query = query.filter(query_can_read(request.catchjwt["userId"]))
+
+    if back_compat:
+        return process_search_back_compat_params(request, query)
+    return process_search_params(request, query)
+
+
+def _target_filters(request):
+    """Q for `range_start`, `range_end` and `bbox`; empty if not in request."""
+    q = Q()
+    # a window of text or time; see [17] at the bottom
+    range_start, range_end = get_target_range(request)
+    if range_start is not None or range_end is not None:
+        q &= query_target_range(range_start, range_end)
+
+    # image regions overlapping a viewport; see [18] at the bottom
+    bbox = get_bbox(request)
+    if bbox is not None:
+        q &= query_target_region(*bbox)
+    return q
+
+
+def _date_filters(request):
+    """Q for `created_*` and `modified_*`; see [20] at the bottom."""
+    q = Q()
+    for field in ("created", "modified"):
+        after, before = get_date_range(request, field)
+        if after is not None or before is not None:
+            q &= query_date_range(field, after, before)
+    return q
+
+
 def process_search_params(request, query):
     usernames = request.GET.getlist("username", [])
     if not usernames:
@@ -584,9 +1740,15 @@ def process_search_params(request, query):
         mlist = [x.capitalize() for x in medias]
         query = query.filter(query_target_medias(mlist))
 
-    text = request.GET.get("text", [])
-    if text:
-        query = query.filter(body_text__search=text)
+    # targets overlapping a window or a region
+    query = query.filter(_target_filters(request))
+
+    # created or modified within a window
+    query = query.filter(_date_filters(request))
+
+    text_query = get_text_search_query(request)
+    if text_query is not None:
+        query = query.filter(search_vector=text_query)
 
     # custom searches for platform params
     q = Anno.custom_manager.search_expression(request.GET)
@@ -616,11 +1778,11 @@ def process_search_back_compat_params(request, query):
         if parent_id:  # not None nor empty string
             pass  # in this case `uri` is irrelevant; see [2] at the bottom
         else:
-            query = query.filter(raw__platform__target_source_id=target)
+            query = query.filter(target_source_id=target)
 
-    text = request.GET.get("text", [])
-    if text:
-        query = query.filter(body_text__search=text)
+    text_query = get_text_search_query(request, back_compat=True)
+    if text_query is not None:
+        query = query.filter(search_vector=text_query)
 
     userids = request.GET.getlist("userid", [])
     if not userids:  # back-compat list in querystring
@@ -636,28 +1798,27 @@ def process_search_back_compat_params(request, query):
     if source:  # 19dec17 naomi: does [2] applies to `source` as well?
         query = query.filter(query_target_sources([source]))
 
-    context_id = request.GET.get("contextId", None)
-    if context_id is None:  # forward-compat!!! see [1] at the bottom
-        context_id = request.GET.get("context_id", None)
+    context_id, collection_id = get_search_platform(request, back_compat=True)
     if context_id:
-        query = query.filter(raw__platform__context_id=context_id)
+        query = query.filter(context_id=context_id)
 
-    collection_id = request.GET.get("collectionId", None)
-    if collection_id is None:  # forward-compat!!! see [1] at the bottom
-        collection_id = request.GET.get("collection_id", None)
     if collection_id:
-        query = query.filter(raw__platform__collection_id=collection_id)
+        query = query.filter(collection_id=collection_id)
 
     tags = request.GET.getlist("tag", [])
     if tags:
         query = query.filter(query_tags(tags))
 
+    # created or modified within a window
+    query = query.filter(_date_filters(request))
+
     return query
 
 
 @require_http_methods(["POST", "OPTIONS"])
 @csrf_exempt
 @require_catchjwt
+@read_from_replica  # see [15] at the bottom
 def copy_api(request):
     # check permissions to copy
     jwt_payload = get_jwt_payload(request)
@@ -746,7 +1907,7 @@ def process_partial_update(request, anno_id):
     pass
 
 
-@require_http_methods(["POST", "GET", "OPTIONS"])
+@require_http_methods(["POST", "GET", "HEAD", "OPTIONS"])
 @csrf_exempt
 @require_catchjwt
 def create_or_search(request):
@@ -767,7 +1928,7 @@ def create_or_search(request):
             )
         )
         return response
-    else:  # it's a GET
+    else:  # it's a GET or HEAD
         response = search_api(request)
         # info log
         logger.info(
@@ -782,6 +1943,27 @@ def create_or_search(request):
         return response
 
 
+@async_api_view(["POST", "GET", "HEAD", "OPTIONS"])
+@require_catchjwt
+async def async_create_or_search(request):
+    """create_or_search for asgi; searches with async orm."""
+    if request.method == "POST":  # writes stay sync, in a transaction
+        return await sync_to_async(create_or_search)(request)
+
+    response = await async_search_api(request)
+    # info log
+    logger.info(
+        "[{0}] {1}:{4} {2} {3}".format(
+            request.catchjwt["consumerKey"],
+            request.method,
+            request.path,
+            request.META["QUERY_STRING"],
+            response.status_code,
+        )
+    )
+    return response
+
+
 @require_http_methods(["POST", "OPTIONS"])
 @csrf_exempt
 @require_catchjwt
@@ -811,6 +1993,7 @@ def crud_compat_read(request, anno_id):
 @require_http_methods(["POST", "PUT", "OPTIONS"])
 @csrf_exempt
 @require_catchjwt
+@read_from_replica  # see [15] at the bottom
 def crud_compat_update(request, anno_id):
     """back compat view for update."""
 
@@ -902,4 +2085,81 @@ def _do_crud_compat_update(request, anno_id):
     annotations with different platform_name that are actually meant to be in the same
     platform ("edX"). Ignoring platform_name is a hack to deal with corrupted data!
 
+[4] `cursor` (or `after`) switches to keyset pagination on (created,
+    anno_id), so deep pages cost the same as the first. The response carries
+    `next_cursor` for the next page, null when done.
+
+[5] `stream=true` streams rows from a server-side cursor, in chunks of
+    CATCH_SEARCH_STREAM_CHUNK_SIZE, so memory does not grow with `limit=-1`.
+    Errors while streaming cannot change the status code anymore.
+
+[6] `text` matches the indexed `search_vector` (body text and tags).
+    `sort=relevance` orders by ts_rank, and `highlight=true` adds a
+    `headline` snippet to the rows in the page.
+
+[7] with CATCH_SEARCH_CACHE_TTL > 0, search responses are cached per
+    querystring and read scope. Writes replace the version of their
+    collection, context or the whole db, so stale entries are never read.
+
+[8] `facets=tag,userid,media,target_source` adds {value, count} lists
+    over the filtered search, ignoring paging; one aggregate query per facet.
+
+[9] `profile=true`, for admins or CAN_PROFILE, adds phase timings and
+    every query with its EXPLAIN (ANALYZE, BUFFERS) plan. It costs about
+    twice the search, skips the cache and cannot be streamed.
+
+[10] POST `_msearch` takes {"searches": [{"params": {...}, "back_compat":
+    false}, ...]} and returns one response per item, in order. Identical
+    searches run once, and a failed item gets {status, payload}.
+
+[11] GET `<anno_id>/thread` returns the anno and its replies at any depth,
+    oldest first, from one recursive query. A reply the user cannot read is
+    left out along with its own replies. `depth` limits the levels, `limit`
+    the rows (`truncated` says if the thread was cut).
+
+[12] reads and v2 searches send a weak ETag, and answer 304 with no body when
+    it is in If-None-Match, before the page is fetched. Reads hash anno_id,
+    `modified` and the replies count. Searches hash the params, who asks, and
+    count and max `modified` of the matches and of their replies, from one
+    aggregate that is also the exact count; other count modes send an ETag
+    only when asked with If-None-Match.
+
+[13] GET `_changes?context_id=...&since=...` lists creates, updates and
+    tombstones for deletes in `modified` order; send `next_since` back while
+    `has_more`. It lags CATCH_CHANGES_FEED_LAG seconds behind, so late
+    commits are not missed.
+
+[14] with CATCH_SEARCH_PREPARE_THRESHOLD set, search statements are
+    prepared on the server after that many runs in a connection. LIMIT and
+    OFFSET are literals, so cursor paging reuses them better than offset.
+
+[15] with CATCHPY_DB_REPLICAS set, searches (msearch and back-compat POST
+    included) and crud GETs read from a replica picked per request; writes
+    go to default. A user who just wrote reads from default for
+    CATCH_DB_REPLICA_STICKY_SECONDS, to see their own writes. The export
+    command reads from a replica too.
+
+[16] with CATCH_ASYNC_VIEWS on, and catchpy served via asgi, search and
+    crud GETs are async views. Streamed and profiled searches fall back to
+    the sync views. Via wsgi, leave it off.
+
+[17] `range_start` and `range_end` return annos whose target overlaps
+    that window: TextPositionSelector offsets for text (not RangeSelector),
+    seconds for video and audio. Either can be left out for an open window.
+
+[18] `bbox=x,y,w,h` returns annos whose image `xywh` region overlaps the
+    box; regions drawn only as svg, or in percent, are not matched.
+
+[19] GET `_suggest?field=tag|username&prefix=...&context_id=...` lists
+    tags or creator names starting with `prefix`, most used first, counting
+    only annos the user can read.
+
+[20] `created_after`, `created_before`, `modified_after` and `modified_before`
+    take iso8601 datetimes, utc if no timezone, for annos created or modified
+    in [after, before); consecutive windows don't overlap.
+
+[21] `count=window` gets the page and `total` in one statement, with
+    COUNT(*) OVER (). HEAD, or `count_only=true`, returns only {total,
+    total_strategy}, and is neither cached nor given an etag.
+
 """
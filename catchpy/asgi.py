@@ -0,0 +1,27 @@
+"""
+ASGI config for catch project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Set CATCH_ASYNC_VIEWS to serve search and reads with async views.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+from dotenv import load_dotenv
+import os
+
+from django.core.asgi import get_asgi_application
+
+# if dotenv file, load it
+dotenv_path = None
+if 'CATCHPY_DOTENV_PATH' in os.environ:
+    dotenv_path = os.environ['CATCHPY_DOTENV_PATH']
+elif os.path.exists(os.path.join('catchpy', 'settings', '.env')):
+    dotenv_path = os.path.join('catchpy', 'settings', '.env')
+if dotenv_path:
+    load_dotenv(dotenv_path)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "catchpy.settings.dev")
+
+application = get_asgi_application()
@@ -5,7 +5,9 @@ import iso8601
 import jwt
 import logging
 
+from asgiref.sync import iscoroutinefunction
 from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
 
 from .catchjwt import decode_token
 from .catchjwt import validate_token
@@ -22,90 +24,110 @@ PRINT_JWT = getattr(settings, 'CATCH_LOG_JWT', False)
 logger = logging.getLogger(__name__)
 
 
+@sync_and_async_middleware
 def jwt_middleware(get_response):
 
-    def middleware(request):
-        '''get jwt info into request.'''
-
-        # default anonymous jwt payload
-        request.catchjwt = {
-            'consumerKey': '',
-            'userId': 'anonymous',
-            'issuedAt': '',
-            'ttl': '',
-            'override': [],
-        }
-
-        msg = ''
-
-
-        # log request time
-        # based on https://djangosnippets.org/snippets/1826/
-        start_ts = datetime.utcnow()
-
-        #
-        # TODO: refactor into more legible code...
-        #
-
-        # get token from request header
-        credentials = get_credentials(request)
-        if credentials is not None:
-            if PRINT_JWT:
-                logger.info('jwt token: {}'.format(credentials))
-            # decode token to get consumerKey
-            payload = decode_token(credentials)
-            if payload is not None:
-                consumer = fetch_consumer(payload)
-                if consumer is not None:
-                    # validate consumer
-                    if not consumer.has_expired():
-                        # validate token signature
-                        validate_signature = decode_token(
-                            credentials, secret_key=consumer.secret_key,
-                            verify=True)
-                        if validate_signature is not None:
-                            # validate token claims
-                            error = validate_token(payload)
-                            if not error:
-                                # valid, replace info in request
-                                payload['consumer'] = consumer
-                                request.catchjwt = payload
-                                #logger.debug(
-                                #    'found profile({}) for consumer({})'.format(
-                                #        consumer.parent_profile,
-                                #        consumer.consumer))
-                            else:
-                                msg = error
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            '''get jwt info into request; consumer fetched with async orm.'''
+            start_ts = datetime.utcnow()
+
+            credentials = get_credentials(request)
+            payload = None
+            consumer = None
+            if credentials is not None:
+                payload = decode_token(credentials)
+                if payload is not None:
+                    consumer = await afetch_consumer(payload)
+            authenticate(request, credentials, payload, consumer)
+
+            response = await get_response(request)
+            return add_request_time(response, start_ts)
+
+    else:
+        def middleware(request):
+            '''get jwt info into request.'''
+            # log request time
+            # based on https://djangosnippets.org/snippets/1826/
+            start_ts = datetime.utcnow()
+
+            # get token from request header
+            credentials = get_credentials(request)
+            payload = None
+            consumer = None
+            if credentials is not None:
+                # decode token to get consumerKey
+                payload = decode_token(credentials)
+                if payload is not None:
+                    consumer = fetch_consumer(payload)
+            authenticate(request, credentials, payload, consumer)
+
+            response = get_response(request)
+            return add_request_time(response, start_ts)
+
+    return middleware
+
+
+def authenticate(request, credentials, payload, consumer):
+    '''validate token for consumer, then set jwt info into request.
+
+    `payload` is the unverified decoded `credentials`, and `consumer` the
+    one for its consumerKey; the only db access is fetching the consumer,
+    so this runs the same for sync and async requests.
+    '''
+    # default anonymous jwt payload
+    request.catchjwt = {
+        'consumerKey': '',
+        'userId': 'anonymous',
+        'issuedAt': '',
+        'ttl': '',
+        'override': [],
+    }
+
+    msg = ''
+    if credentials is not None:
+        if PRINT_JWT:
+            logger.info('jwt token: {}'.format(credentials))
+        if payload is not None:
+            if consumer is not None:
+                # validate consumer
+                if not consumer.has_expired():
+                    # validate token signature
+                    validate_signature = decode_token(
+                        credentials, secret_key=consumer.secret_key,
+                        verify=True)
+                    if validate_signature is not None:
+                        # validate token claims
+                        error = validate_token(payload)
+                        if not error:
+                            # valid, replace info in request
+                            payload['consumer'] = consumer
+                            request.catchjwt = payload
                         else:
-                            msg = 'failed to validate auth token signature'
+                            msg = error
                     else:
-                        msg = 'consumer({}) has expired'.format(consumer.consumer)
+                        msg = 'failed to validate auth token signature'
                 else:
-                    msg = 'invalid consumerKey in auth token'
+                    msg = 'consumer({}) has expired'.format(consumer.consumer)
             else:
-                msg = 'failed to decode auth token'
+                msg = 'invalid consumerKey in auth token'
         else:
-            msg = 'failed to find auth token in request header'
-
-        request.catchjwt['error'] = msg
-        if msg and PRINT_JWT_ERROR:
-            logger.info(msg)
-
-        response = get_response(request)
-
-        # code to be executed for each request/response after
-        # the view is called
-
-        # calculate and log the response time
-        ts_delta = (datetime.utcnow() - start_ts).total_seconds()
-        response['x-hx-custom1'] = format(str(ts_delta))
-        if PRINT_REQUEST_TIME:
-            logger.info('[REQUEST_TIME] {}'.format(str(ts_delta)))
+            msg = 'failed to decode auth token'
+    else:
+        msg = 'failed to find auth token in request header'
 
+    request.catchjwt['error'] = msg
+    if msg and PRINT_JWT_ERROR:
+        logger.info(msg)
 
-        return response
 
-    return middleware
+def add_request_time(response, start_ts):
+    '''calculate and log the response time.'''
+    ts_delta = (datetime.utcnow() - start_ts).total_seconds()
+    response['x-hx-custom1'] = format(str(ts_delta))
+    if PRINT_REQUEST_TIME:
+        logger.info('[REQUEST_TIME] {}'.format(str(ts_delta)))
+    return response
 
 
 def get_credentials(request):
@@ -147,3 +169,19 @@ def fetch_consumer(token_payload):
         return None
     else:
         return consumer
+
+
+async def afetch_consumer(token_payload):
+    '''async version of fetch_consumer(), for requests served via asgi.'''
+    consumer_key = token_payload.get('consumerKey', None)
+    if consumer_key is None:
+        return None
+
+    try:
+        consumer = await Consumer._default_manager.aget(pk=consumer_key)
+    except Consumer.DoesNotExist:
+        logger.error('invalid consumerKey({}) in auth token'.format(
+            consumer_key))
+        return None
+    else:
+        return consumer
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 import pytest
+from asgiref.sync import async_to_sync
 from django.http import HttpResponse
 from django.test import RequestFactory
 from zoneinfo import ZoneInfo
@@ -69,6 +70,41 @@ def test_middleware_ok():
     assert request.catchjwt["consumer"] == c
 
 
+@pytest.mark.django_db
+def test_middleware_async_ok():
+    c = Consumer._default_manager.create()
+    token_enc = encode_catchjwt(
+        apikey=c.consumer,
+        secret=c.secret_key,
+        user="clarice_lispector",
+    )
+    factory = RequestFactory()
+    extra = {JWT_AUTH_HEADER: "Token {}".format(token_enc)}
+    request = factory.get("/anno", **extra)
+
+    response = HttpResponse("ok")
+
+    async def get_response(request):
+        return response
+
+    # async get_response gets an async middleware, fetching consumer async
+    middleware = jwt_middleware(get_response)
+    resp = async_to_sync(middleware)(request)
+
+    assert resp is response
+    assert "x-hx-custom1" in resp
+    assert request.catchjwt["error"] == ""
+    assert request.catchjwt["userId"] == "clarice_lispector"
+    assert request.catchjwt["consumer"] == c
+
+    # unknown consumer
+    c.delete()
+    request = factory.get("/anno", **extra)
+    resp = async_to_sync(middleware)(request)
+    assert request.catchjwt["userId"] == "anonymous"
+    assert request.catchjwt["error"] == "invalid consumerKey in auth token"
+
+
 @pytest.mark.django_db
 def test_middleware_header_missing():
     factory = RequestFactory()
@@ -229,6 +229,80 @@ CATCH_JSONLD_CONTEXT_IRI = os.environ.get(
 # max number of rows to be returned in a search request
 CATCH_RESPONSE_LIMIT = int(os.environ.get('CATCH_RESPONSE_LIMIT', 200))
 
+# rows fetched per round trip when streaming search responses
+CATCH_SEARCH_STREAM_CHUNK_SIZE = int(
+    os.environ.get('CATCH_SEARCH_STREAM_CHUNK_SIZE', 100))
+
+# how search computes `total`: exact, cached, estimated, none, or window
+CATCH_SEARCH_COUNT_MODE = os.environ.get('CATCH_SEARCH_COUNT_MODE', 'exact')
+# per consumer key overrides for the count mode, ex: {'hxat-prod': 'cached'}
+CATCH_SEARCH_COUNT_MODE_BY_CONSUMER = {}
+# seconds a `cached` count is kept
+CATCH_SEARCH_COUNT_CACHE_TTL = int(
+    os.environ.get('CATCH_SEARCH_COUNT_CACHE_TTL', 30))
+# cache backend for search counts and responses; with many app servers, it
+# must be a shared backend (memcached, redis) for writes to invalidate responses
+CATCH_SEARCH_CACHE_ALIAS = os.environ.get('CATCH_SEARCH_CACHE_ALIAS', 'default')
+# seconds a search response is cached; 0 turns the cache off
+CATCH_SEARCH_CACHE_TTL = int(os.environ.get('CATCH_SEARCH_CACHE_TTL', 0))
+
+# max number of searches in one _msearch request
+CATCH_MSEARCH_LIMIT = int(os.environ.get('CATCH_MSEARCH_LIMIT', 20))
+
+# runs of a search statement in a db connection before it's prepared on the
+# server, and its plan reused while the connection lasts; unset is off.
+# turns on server-side binding for the default database, which prepared
+# statements need with psycopg 3. Connect directly or via a session pooler:
+# transaction poolers may run a statement in a session that did not prepare it.
+CATCH_SEARCH_PREPARE_THRESHOLD = os.environ.get(
+    'CATCH_SEARCH_PREPARE_THRESHOLD', None)
+if CATCH_SEARCH_PREPARE_THRESHOLD:
+    CATCH_SEARCH_PREPARE_THRESHOLD = int(CATCH_SEARCH_PREPARE_THRESHOLD)
+    DATABASES['default'].setdefault('OPTIONS', {})['server_side_binding'] = True
+else:
+    CATCH_SEARCH_PREPARE_THRESHOLD = None
+
+# read replicas, as comma separated host[:port][=weight], ex: 'r1=2,r2:5433'.
+# search, read-only crud and export read from a replica, picked by weight;
+# writes go to default. A user that wrote reads from default for the next
+# CATCH_DB_REPLICA_STICKY_SECONDS, kept in the CATCH_SEARCH_CACHE_ALIAS
+# cache, so it should be longer than the replication lag.
+CATCHPY_DB_REPLICAS = os.environ.get('CATCHPY_DB_REPLICAS', '')
+CATCH_DB_REPLICA_WEIGHTS = {}
+for i, replica in enumerate(
+        r.strip() for r in CATCHPY_DB_REPLICAS.split(',') if r.strip()):
+    address, _, weight = replica.partition('=')
+    host, _, port = address.partition(':')
+    alias = 'replica_{}'.format(i)
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        HOST=host,
+        PORT=port or DATABASES['default']['PORT'],
+        OPTIONS=dict(DATABASES['default'].get('OPTIONS', {})),
+        # tests read the same test database, see settings/test.py
+        TEST={'MIRROR': 'default'},
+    )
+    CATCH_DB_REPLICA_WEIGHTS[alias] = int(weight or 1)
+CATCH_DB_REPLICA_STICKY_SECONDS = int(
+    os.environ.get('CATCH_DB_REPLICA_STICKY_SECONDS', 5))
+DATABASE_ROUTERS = ['catchpy.anno.routers.ReplicaRouter']
+
+# seconds the changes feed stays behind now; a write is visible in the feed
+# only after this lag, so it must be longer than write transactions take
+CATCH_CHANGES_FEED_LAG = int(os.environ.get('CATCH_CHANGES_FEED_LAG', 2))
+
+# values returned by _suggest when `limit` is not in the request
+CATCH_SUGGEST_LIMIT = int(os.environ.get('CATCH_SUGGEST_LIMIT', 10))
+
+# async views for search and crud reads; only when served via catchpy.asgi
+CATCH_ASYNC_VIEWS = os.environ.get(
+    'CATCH_ASYNC_VIEWS', 'false').lower() == 'true'
+
+# postgres text search config for `text` searches, ex: english, simple
+CATCH_TEXT_SEARCH_CONFIG = os.environ.get('CATCH_TEXT_SEARCH_CONFIG', 'english')
+# per platform_name overrides for the text search config, ex: {'hxat-fr': 'french'}
+CATCH_TEXT_SEARCH_CONFIG_BY_PLATFORM = {}
+
 # default platform for annotatorjs annotations
 CATCH_DEFAULT_PLATFORM_NAME = os.environ.get(
     'CATCH_DEFAULT_PLATFORM_NAME', 'hxat-edx_v1.0')
@@ -12,6 +12,10 @@ from .base import *  # noqa
 
 DEBUG = True
 
+# replica for router tests, reading the test database of default; it is used
+# only where tests give it a weight, see anno/tests/test_routers.py
+DATABASES["replica"] = dict(DATABASES["default"], TEST={"MIRROR": "default"})  # noqa: F405
+
 # add db logging to dev settings
 LOGGING["loggers"]["django.db"] = {
     "level": "INFO",
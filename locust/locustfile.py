@@ -275,7 +275,56 @@ class UserBehavior_CreateWebAnnotation(TaskSet):
                 response.success()
 
 
+class UserBehavior_PollSearch(TaskSet):
+    '''many clients polling small searches and reads, as when a class is
+    open in the hxat; compare catchpy via wsgi and via asgi, see README.'''
+    def on_start(self):
+        self.context = 'fake_context'
+        self.collection = 'fake_collection'
+        self.anno_ids = []
+
+    @task(20)
+    def poll_search(self):
+        token = make_token_for_user(random_user())
+        search_query = 'context_id={}&collection_id={}&limit=20'.format(
+            self.context, self.collection)
+
+        response = self.client.get(
+            '/annos/?{}'.format(search_query),
+            catch_response=True,
+            headers={
+                'Authorization': 'token {}'.format(token),
+            }, name='/annos/?limit=20', verify=False)
+
+        if response.status_code == 200:
+            self.anno_ids = [a['id'] for a in response.json()['rows']]
+            response.success()
+        else:
+            response.failure(response.status_code)
+
+    @task(10)
+    def read_annotation(self):
+        if not self.anno_ids:
+            return
+        token = make_token_for_user(random_user())
+        a_id = self.anno_ids[randint(0, len(self.anno_ids) - 1)]
+
+        response = self.client.get(
+            '/annos/{}'.format(a_id),
+            catch_response=True,
+            headers={
+                'Authorization': 'token {}'.format(token),
+            }, name='/annos/[id]', verify=False)
+
+        # public annos in fake_context; 403 is fine for private ones
+        if response.status_code in (200, 403):
+            response.success()
+        else:
+            response.failure(response.status_code)
+
+
 class WebsiteUser(HttpLocust):
     task_set = UserBehavior_WebAnnotation
-    #task_set = UserBehavior_AnnotatorJS
+    # task_set = UserBehavior_AnnotatorJS
+    # task_set = UserBehavior_PollSearch
     wait_time = between(60, 120)